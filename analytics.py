@@ -0,0 +1,282 @@
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from metrics import timed
+from storage import SESSIONS_DIR, SessionStore, get_session_store
+
+DB_NAME = "analytics.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    student TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    at REAL NOT NULL,
+    pass_count INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    solved INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS student_tasks (
+    student TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    first_at REAL NOT NULL,
+    last_at REAL NOT NULL,
+    last_pass_rate REAL NOT NULL,
+    solved_at REAL,
+    attempts_to_solve INTEGER,
+    PRIMARY KEY (student, task_id)
+);
+CREATE TABLE IF NOT EXISTS task_stats (
+    task_id TEXT PRIMARY KEY,
+    runs INTEGER NOT NULL DEFAULT 0,
+    pass_rate_sum REAL NOT NULL DEFAULT 0,
+    students INTEGER NOT NULL DEFAULT 0,
+    solved INTEGER NOT NULL DEFAULT 0,
+    attempts_to_solve_sum INTEGER NOT NULL DEFAULT 0,
+    seconds_to_solve_sum REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS student_stats (
+    student TEXT PRIMARY KEY,
+    runs INTEGER NOT NULL DEFAULT 0,
+    pass_rate_sum REAL NOT NULL DEFAULT 0,
+    tasks INTEGER NOT NULL DEFAULT 0,
+    solved INTEGER NOT NULL DEFAULT 0,
+    last_at REAL NOT NULL DEFAULT 0,
+    live INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS student_stats_last_at ON student_stats (last_at);
+CREATE TABLE IF NOT EXISTS failing_cases (
+    task_id TEXT NOT NULL,
+    description TEXT NOT NULL,
+    failures INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (task_id, description)
+);
+CREATE INDEX IF NOT EXISTS failing_cases_failures ON failing_cases (task_id, failures);
+CREATE TABLE IF NOT EXISTS ingested_sessions (
+    name TEXT PRIMARY KEY,
+    updated REAL NOT NULL
+);
+"""
+
+
+def _ratio(num: float, den: float) -> Optional[float]:
+    return num / den if den else None
+
+
+class AnalyticsStore:
+    """Progress aggregates per task and per student, updated in place by each recorded run.
+
+    Every run touches a handful of counter rows, so dashboards read precomputed totals
+    instead of rescanning session history.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    @timed("storage", op="record_run")
+    def record_run(self, student: str, task_id: str, result: Dict[str, Any], at: Optional[float] = None, live: bool = True) -> None:
+        """Fold one evaluation result into the aggregates."""
+        at = time.time() if at is None else at
+        total = result.get("total") or 0
+        pass_count = result.get("pass_count") or 0
+        solved = bool(result.get("success")) and total > 0 and pass_count == total
+        pass_rate = pass_count / total if total else 0.0
+        failing = sorted({d.get("description") or f"case {d.get('index')}" for d in result.get("details") or [] if not d.get("ok")})
+        with self._lock:
+            c = self._conn
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                c.execute(
+                    "INSERT INTO runs (student, task_id, at, pass_count, total, solved) VALUES (?, ?, ?, ?, ?, ?)",
+                    (student, task_id, at, pass_count, total, int(solved)),
+                )
+                row = c.execute(
+                    "SELECT attempts, first_at, solved_at FROM student_tasks WHERE student = ? AND task_id = ?",
+                    (student, task_id),
+                ).fetchone()
+                new_pair = row is None
+                attempts = 1 if new_pair else row[0] + 1
+                first_at = at if new_pair else row[1]
+                newly_solved = solved and (new_pair or row[2] is None)
+                c.execute(
+                    """
+                    INSERT INTO student_tasks (student, task_id, attempts, first_at, last_at, last_pass_rate, solved_at, attempts_to_solve)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (student, task_id) DO UPDATE SET
+                        attempts = excluded.attempts, last_at = excluded.last_at, last_pass_rate = excluded.last_pass_rate,
+                        solved_at = COALESCE(solved_at, excluded.solved_at),
+                        attempts_to_solve = COALESCE(attempts_to_solve, excluded.attempts_to_solve)
+                    """,
+                    (student, task_id, attempts, first_at, at, pass_rate, at if newly_solved else None, attempts if newly_solved else None),
+                )
+                c.execute("INSERT OR IGNORE INTO task_stats (task_id) VALUES (?)", (task_id,))
+                c.execute(
+                    """
+                    UPDATE task_stats SET runs = runs + 1, pass_rate_sum = pass_rate_sum + ?, students = students + ?,
+                        solved = solved + ?, attempts_to_solve_sum = attempts_to_solve_sum + ?,
+                        seconds_to_solve_sum = seconds_to_solve_sum + ?
+                    WHERE task_id = ?
+                    """,
+                    (
+                        pass_rate,
+                        int(new_pair),
+                        int(newly_solved),
+                        attempts if newly_solved else 0,
+                        at - first_at if newly_solved else 0.0,
+                        task_id,
+                    ),
+                )
+                c.execute("INSERT OR IGNORE INTO student_stats (student) VALUES (?)", (student,))
+                c.execute(
+                    """
+                    UPDATE student_stats SET runs = runs + 1, pass_rate_sum = pass_rate_sum + ?, tasks = tasks + ?,
+                        solved = solved + ?, last_at = MAX(last_at, ?), live = MAX(live, ?)
+                    WHERE student = ?
+                    """,
+                    (pass_rate, int(new_pair), int(newly_solved), at, int(live), student),
+                )
+                if failing:
+                    c.executemany(
+                        """
+                        INSERT INTO failing_cases (task_id, description, failures) VALUES (?, ?, 1)
+                        ON CONFLICT (task_id, description) DO UPDATE SET failures = failures + 1
+                        """,
+                        [(task_id, desc) for desc in failing],
+                    )
+                c.execute("COMMIT")
+            except BaseException:
+                c.execute("ROLLBACK")
+                raise
+
+    def ingest_sessions(self, store: SessionStore) -> int:
+        """Record saved session results not seen before, as one run each; returns how many.
+
+        Runs are recorded under the session's student id (its name for sessions saved without
+        one). Students whose runs were recorded live are skipped so their saves are not counted twice.
+        """
+        with self._lock:
+            seen = dict(self._conn.execute("SELECT name, updated FROM ingested_sessions"))
+            live = {row[0] for row in self._conn.execute("SELECT student FROM student_stats WHERE live = 1")}
+        ingested = 0
+        offset = 0
+        while True:
+            page = store.list(limit=200, offset=offset, order="name")
+            if not page:
+                return ingested
+            offset += len(page)
+            for info in page:
+                since = seen.get(info.name)
+                student = info.student or info.name
+                if student in live or (since is not None and since >= info.updated):
+                    continue
+                for task_id, result, updated in store.items(info.name, "results", since or 0.0):
+                    self.record_run(student, task_id, result, at=updated, live=False)
+                    ingested += 1
+                with self._lock:
+                    self._conn.execute("INSERT OR REPLACE INTO ingested_sessions VALUES (?, ?)", (info.name, info.updated))
+
+    def task_summary(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM task_stats ORDER BY task_id").fetchall()
+        return [
+            {
+                "task_id": task_id,
+                "runs": runs,
+                "students": students,
+                "avg_pass_rate": _ratio(pass_rate_sum, runs),
+                "solve_rate": _ratio(solved, students),
+                "avg_attempts_to_solve": _ratio(attempts_sum, solved),
+                "avg_minutes_to_solve": _ratio(seconds_sum / 60, solved),
+            }
+            for task_id, runs, pass_rate_sum, students, solved, attempts_sum, seconds_sum in rows
+        ]
+
+    def common_failures(self, task_id: str, limit: int = 5) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT description, failures FROM failing_cases WHERE task_id = ? ORDER BY failures DESC LIMIT ?",
+                (task_id, limit),
+            ).fetchall()
+        return [{"description": d, "failures": n} for d, n in rows]
+
+    def student_summary(self, query: str = "", limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """One page of students, most recently active first."""
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT student, runs, pass_rate_sum, tasks, solved, last_at FROM student_stats
+                WHERE instr(lower(student), lower(?)) > 0 ORDER BY last_at DESC LIMIT ? OFFSET ?
+                """,
+                (query, limit, offset),
+            ).fetchall()
+        return [
+            {
+                "student": student,
+                "runs": runs,
+                "avg_pass_rate": _ratio(pass_rate_sum, runs),
+                "tasks_attempted": tasks,
+                "tasks_solved": solved,
+                "last_active": last_at,
+            }
+            for student, runs, pass_rate_sum, tasks, solved, last_at in rows
+        ]
+
+    def count_students(self, query: str = "") -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM student_stats WHERE instr(lower(student), lower(?)) > 0", (query,)
+            ).fetchone()[0]
+
+    def student_tasks(self, student: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT task_id, attempts, last_pass_rate, attempts_to_solve, solved_at - first_at
+                FROM student_tasks WHERE student = ? ORDER BY task_id
+                """,
+                (student,),
+            ).fetchall()
+        return [
+            {
+                "task_id": task_id,
+                "attempts": attempts,
+                "last_pass_rate": last_pass_rate,
+                "attempts_to_solve": attempts_to_solve,
+                "minutes_to_solve": seconds / 60 if seconds is not None else None,
+            }
+            for task_id, attempts, last_pass_rate, attempts_to_solve, seconds in rows
+        ]
+
+
+_ANALYTICS: Optional[AnalyticsStore] = None
+_ANALYTICS_LOCK = threading.Lock()
+
+
+def get_analytics() -> AnalyticsStore:
+    global _ANALYTICS
+    with _ANALYTICS_LOCK:
+        if _ANALYTICS is None:
+            _ANALYTICS = AnalyticsStore(SESSIONS_DIR / DB_NAME)
+        return _ANALYTICS
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fold saved session results into the progress analytics.")
+    parser.add_argument("--sessions-dir", default=str(SESSIONS_DIR))
+    args = parser.parse_args()
+    sessions_dir = Path(args.sessions_dir)
+    analytics = AnalyticsStore(sessions_dir / DB_NAME)
+    print(f"ingested {analytics.ingest_sessions(get_session_store(sessions_dir))} result(s)")
+    print(json.dumps(analytics.task_summary(), indent=2))
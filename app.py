@@ -1,44 +1,23 @@
 import os
 import json
+import uuid
+from datetime import datetime
 from typing import Dict, Any
 from pathlib import Path
 
 import streamlit as st
 
 from config import get_default_config, Config
-from tasks import get_tasks, Task
+from tasks import Task, list_tasks, load_task
 from evaluator import evaluate_solution
-from storage import save_session, list_sessions, load_session
+from cache import get_result_cache
+from storage import count_sessions, get_session_store, save_session, list_sessions, load_session
+from analytics import get_analytics
+from live import LiveRunner
+from editors import get_editor
+from metrics import start_metrics_server
 from utils import truncate_text
-from llm import ask_llm_for_text, build_hint_prompt, build_explain_prompt
-
-# Try to import Monaco Editor variants, fallback to ACE or textarea
-EditorKind = "textarea"
-
-def _init_editor():
-    global EditorKind
-    try:
-        from streamlit_monaco_editor import st_monaco_editor  # type: ignore
-        EditorKind = "monaco_editor"
-        return st_monaco_editor
-    except Exception:
-        pass
-    try:
-        from streamlit_monaco import st_monaco  # type: ignore
-        EditorKind = "monaco"
-        return st_monaco
-    except Exception:
-        pass
-    try:
-        import streamlit_ace as st_ace  # type: ignore
-        EditorKind = "ace"
-        return st_ace.st_ace
-    except Exception:
-        pass
-    EditorKind = "textarea"
-    return None
-
-render_editor_component = _init_editor()
+from llm import build_hint_prompt, build_explain_prompt, get_llm_cache, stream_llm
 
 ASSETS_CSS = Path(__file__).resolve().parent / "assets" / "styles.css"
 if ASSETS_CSS.exists():
@@ -52,6 +31,21 @@ if "code" not in st.session_state:
     st.session_state.code = {}
 if "results" not in st.session_state:
     st.session_state.results = {}
+if "llm_answers" not in st.session_state:
+    st.session_state.llm_answers = {}
+if "llm_metrics" not in st.session_state:
+    st.session_state.llm_metrics = []
+if "student_id" not in st.session_state:
+    st.session_state.student_id = f"anonymous-{uuid.uuid4().hex[:8]}"
+
+# Once per process; reruns get the running server back.
+start_metrics_server(get_default_config().metrics_port)
+
+
+def current_student() -> str:
+    # One id for live runs and saves: it is stored with every saved session and adopted when
+    # one is loaded, so ingest_sessions can tell which saved results were already recorded live.
+    return st.session_state.student_id
 
 
 def render_header():
@@ -71,6 +65,16 @@ def render_settings(cfg: Config) -> Config:
         temp = st.slider("AI Temperature", 0.0, 1.0, float(cfg.ai_temperature), 0.1)
         timeout = st.number_input("Execution Timeout (s)", min_value=1, max_value=20, value=int(cfg.execution_timeout_seconds))
         code_runner = st.selectbox("Code Runner", ["local", "interpreter_api"], index=["local", "interpreter_api"].index(cfg.code_runner))
+        fail_fast = st.checkbox("Stop at first failing test", value=cfg.fail_fast)
+        live_mode = st.checkbox("Live mode (run tests as you type)", value=cfg.live_mode)
+        cache = get_result_cache()
+        if cache is not None:
+            stats = cache.stats()
+            st.caption(f"Result cache: {stats['hits']} hits / {stats['misses']} misses ({stats['hit_rate']:.0%})")
+        llm_cache = get_llm_cache()
+        if llm_cache is not None:
+            stats = llm_cache.stats()
+            st.caption(f"AI answer cache: {stats['hits']} hits / {stats['misses']} misses ({stats['hit_rate']:.0%}), {stats['coalesced']} shared")
         new_cfg = Config(
             llm_provider=provider,
             openai_model=model if provider == "OpenAI" else cfg.openai_model,
@@ -78,14 +82,34 @@ def render_settings(cfg: Config) -> Config:
             ai_temperature=temp,
             execution_timeout_seconds=int(timeout),
             code_runner=code_runner,
+            fail_fast=fail_fast,
+            live_mode=live_mode,
+            live_debounce_ms=cfg.live_debounce_ms,
         )
         return new_cfg
 
 
-def render_task_selector(tasks):
-    task_titles = [t.title for t in tasks]
-    idx = st.sidebar.selectbox("Choose task", list(range(len(tasks))), format_func=lambda i: task_titles[i])
-    return tasks[idx]
+# Longest list the task selectbox shows; narrower filters reach the rest.
+TASK_LIST_LIMIT = 200
+
+
+def render_task_selector() -> Task:
+    # Filtering only touches the prebuilt index; the chosen task's files are read on demand.
+    with st.sidebar:
+        index = list_tasks()
+        query = st.text_input("Search tasks", value="")
+        difficulty = st.selectbox("Difficulty", ["Any"] + sorted({t.difficulty for t in index if t.difficulty}))
+        tags = st.multiselect("Tags", sorted({tag for t in index for tag in t.tags}))
+        matches = list_tasks(query, None if difficulty == "Any" else difficulty, tags)
+        if not matches:
+            st.warning("No tasks match the filters.")
+            st.stop()
+        shown = matches[:TASK_LIST_LIMIT]
+        if len(matches) > len(shown):
+            st.caption(f"Showing {len(shown)} of {len(matches)} matching tasks; narrow the search to see more.")
+        titles = {t.id: t.title for t in shown}
+        task_id = st.selectbox("Choose task", list(titles), format_func=lambda i: titles[i])
+    return load_task(task_id)
 
 
 def render_editor(task: Task, cfg: Config) -> str:
@@ -96,12 +120,15 @@ def render_editor(task: Task, cfg: Config) -> str:
 
     current_code = st.session_state.code.get(task.id, task.starter_code)
 
-    if EditorKind == "monaco_editor" and render_editor_component:
-        code = render_editor_component(value=current_code, language="python", height="420px", theme="vs-dark", key=f"editor_{task.id}")
-    elif EditorKind == "monaco" and render_editor_component:
-        code = render_editor_component(value=current_code, language="python", height="420px", theme="vs-dark", key=f"editor_{task.id}")
-    elif EditorKind == "ace" and render_editor_component:
-        code = render_editor_component(value=current_code, language="python", theme="monokai", key=f"editor_{task.id}", height=420)
+    # Monaco variants, then ACE, then a plain textarea; imported on first use.
+    editor_kind, component = get_editor()
+    if editor_kind == "monaco_editor" and component:
+        code = component(value=current_code, language="python", height="420px", theme="vs-dark", key=f"editor_{task.id}")
+    elif editor_kind == "monaco" and component:
+        code = component(value=current_code, language="python", height="420px", theme="vs-dark", key=f"editor_{task.id}")
+    elif editor_kind == "ace" and component:
+        # auto_update sends every edit back without the Apply button, which live mode relies on.
+        code = component(value=current_code, language="python", theme="monokai", key=f"editor_{task.id}", height=420, auto_update=cfg.live_mode)
     else:
         code = st.text_area("Code", current_code, height=420, key=f"editor_{task.id}")
 
@@ -118,32 +145,104 @@ def render_actions(task: Task, cfg: Config, user_code: str):
     with c3:
         explain = st.button("🧠 Explain Code")
 
-    if run:
-        res = evaluate_solution(user_code, task, timeout_seconds=int(cfg.execution_timeout_seconds))
-        st.session_state.results[task.id] = res
+    model = cfg.openai_model if cfg.llm_provider == "OpenAI" else cfg.ollama_model
 
+    # LLM requests start first and stream on background threads, so tests run meanwhile.
     if hint:
-        res = st.session_state.results.get(task.id)
-        failing = []
-        if res and res.get("details"):
-            for d in res["details"]:
-                if not d.get("ok"):
-                    failing.append(f"- {d.get('description')}: expected={d.get('expected')} got={d.get('output')} error={d.get('error')}")
-        details = "\n".join(failing) if failing else "No previous runs or all tests passed. Suggest potential edge cases."
-        prompt = build_hint_prompt(task.title, task.description, details, user_code)
-        text = ask_llm_for_text(cfg.llm_provider, cfg.openai_model if cfg.llm_provider=="OpenAI" else cfg.ollama_model, cfg.ai_temperature, prompt)
-        if text:
-            st.info(text)
-        else:
-            st.info("LLM not configured. Set provider and API key in .env if needed.")
+        res = st.session_state.results.get(task.id) or {}
+        prompt = build_hint_prompt(task.title, task.description, res.get("details") or [], user_code, task.function_name)
+        st.session_state.llm_answers[(task.id, "hint")] = stream_llm(cfg.llm_provider, model, cfg.ai_temperature, prompt)
 
     if explain:
-        prompt = build_explain_prompt(task.title, task.description, user_code)
-        text = ask_llm_for_text(cfg.llm_provider, cfg.openai_model if cfg.llm_provider=="OpenAI" else cfg.ollama_model, cfg.ai_temperature, prompt)
-        if text:
-            st.info(text)
-        else:
-            st.info("LLM not configured.")
+        prompt = build_explain_prompt(task.title, task.description, user_code, task.function_name)
+        st.session_state.llm_answers[(task.id, "explain")] = stream_llm(cfg.llm_provider, model, cfg.ai_temperature, prompt)
+
+    if run:
+        live = st.empty()
+        rows = []
+
+        def on_result(detail: Dict[str, Any]):
+            rows.append(detail)
+            # Sharded runs report cases out of order.
+            rows.sort(key=lambda d: d.get("index", 0))
+            with live.container():
+                st.caption(f"Running tests… {len(rows)}/{len(task.tests)}")
+                render_detail_rows(rows)
+
+        res = evaluate_solution(user_code, task, timeout_seconds=int(cfg.execution_timeout_seconds), code_runner=cfg.code_runner, on_result=on_result, fail_fast=cfg.fail_fast)
+        live.empty()
+        st.session_state.results[task.id] = res
+        get_analytics().record_run(current_student(), task.id, res)
+
+
+LLM_ANSWER_KINDS = [
+    ("hint", "LLM not configured. Set provider and API key in .env if needed."),
+    ("explain", "LLM not configured."),
+]
+
+
+def render_llm_answers(task: Task, cfg: Config):
+    for kind, not_configured in LLM_ANSWER_KINDS:
+        stream = st.session_state.llm_answers.get((task.id, kind))
+        if stream is None:
+            continue
+        placeholder = st.empty()
+        text = ""
+        for chunk in stream:
+            text += chunk
+            placeholder.info(text)
+        if not stream.configured:
+            placeholder.info(not_configured)
+            continue
+        notes = ["⚡ Cached answer"] if stream.cached else []
+        if stream.ttft_ms is not None:
+            notes.append(f"first token {stream.ttft_ms:.0f} ms · total {stream.total_ms:.0f} ms")
+        st.caption(" · ".join(notes))
+        if not getattr(stream, "recorded", False):
+            stream.recorded = True
+            st.session_state.llm_metrics.append({
+                "kind": kind,
+                "task_id": task.id,
+                "provider": cfg.llm_provider,
+                "ttft_ms": stream.ttft_ms,
+                "total_ms": stream.total_ms,
+                "cached": stream.cached,
+            })
+
+
+def render_detail_rows(details):
+    for d in details:
+        cls = "result-pass" if d.get("ok") else "result-fail"
+        label = f"{d.get('description')} ⏱️ (did not finish)" if d.get("hung") else d.get("description")
+        perf = ""
+        if d.get("wall_ms") is not None:
+            perf = f"<br/><small>wall {d['wall_ms']:.2f} ms | cpu {d.get('cpu_ms', 0):.2f} ms | peak RSS +{d.get('peak_kb', 0):.0f} KB</small>"
+        st.markdown(f"<div class='{cls}'><b>{label}</b><br/>expected={d.get('expected')} | output={d.get('output')} | error={d.get('error')}{perf}</div>", unsafe_allow_html=True)
+
+
+def render_timing(res: Dict[str, Any]):
+    timing = res.get("timing") or {}
+    if "total_ms" not in timing:
+        return
+    startup = f"startup {timing['startup_ms']:.0f} ms · " if "startup_ms" in timing else ""
+    st.caption(f"⏱️ {startup}total {timing['total_ms']:.0f} ms")
+
+
+def render_perf(res: Dict[str, Any]):
+    perf = res.get("perf")
+    if not perf:
+        return
+    if perf.get("ok") is True:
+        st.success(f"📈 {perf['message']}")
+    elif perf.get("ok") is False:
+        st.warning(f"📈 {perf['message']}")
+    else:
+        st.info(f"📈 {perf['message']}")
+    if perf.get("points"):
+        sizes = ", ".join(f"n={int(n)}: {s * 1000:.2f} ms" for n, s in perf["points"])
+        st.caption(sizes)
+    if perf.get("note"):
+        st.caption(perf["note"])
 
 
 def render_results(task: Task):
@@ -157,51 +256,201 @@ def render_results(task: Task):
         raw = res.get("raw")
         if raw:
             st.code(raw)
+        if res.get("details"):
+            st.metric("Passed before failure", f"{res.get('pass_count', 0)}/{res.get('total', 0)}")
+            render_detail_rows(res["details"])
+        render_timing(res)
         return
     passed = res.get("pass_count", 0)
     total = res.get("total", 0)
     st.metric("Passed", f"{passed}/{total}")
-    for d in res.get("details", []):
-        cls = "result-pass" if d.get("ok") else "result-fail"
-        st.markdown(f"<div class='{cls}'><b>{d.get('description')}</b><br/>expected={d.get('expected')} | output={d.get('output')} | error={d.get('error')}</div>", unsafe_allow_html=True)
+    if res.get("cached"):
+        st.caption("⚡ Cached result (code unchanged since a previous run)")
+    if res.get("stopped_early"):
+        st.caption(f"⏹ Stopped at the first failing test; {total - len(res.get('details', []))} test(s) not run")
+    render_timing(res)
+    render_perf(res)
+    render_detail_rows(res.get("details", []))
+
+
+def _live_key(task: Task, user_code: str) -> str:
+    return f"{task.id}\0{user_code}"
+
+
+def submit_live_run(task: Task, cfg: Config, user_code: str):
+    """Queue a background run of user_code; an earlier live run still pending or running is cancelled."""
+    runner = st.session_state.get("live_runner")
+    if runner is None:
+        runner = st.session_state.live_runner = LiveRunner(cfg.live_debounce_ms / 1000)
+    key = _live_key(task, user_code)
+    if runner.submitted_key == key:
+        return
+    timeout, code_runner, fail_fast = int(cfg.execution_timeout_seconds), cfg.code_runner, cfg.fail_fast
+    # Live runs are not recorded in analytics: every pause while typing would count as an attempt.
+    runner.submit(key, lambda cancel: evaluate_solution(
+        user_code, task, timeout_seconds=timeout, code_runner=code_runner, fail_fast=fail_fast, cancel=cancel,
+    ))
+
+
+def stop_live_runs():
+    runner = st.session_state.get("live_runner")
+    if runner is not None:
+        runner.cancel()
+        st.session_state.live_runner = None
+
+
+def render_live_results(task: Task):
+    runner = st.session_state.get("live_runner")
+    latest = runner.latest() if runner is not None else None
+    # Only a result for the code currently in the editor is shown.
+    if latest is not None and latest[0] == _live_key(task, st.session_state.code.get(task.id, "")):
+        st.session_state.results[task.id] = latest[1]
+    if runner is not None and runner.busy:
+        st.caption("⏳ Testing your latest edit…")
+    render_results(task)
+
+
+# Polls for the background result without rerunning the whole page (Streamlit >= 1.33; older
+# versions pick it up on the next rerun).
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+if _fragment is not None:
+    render_live_results = _fragment(run_every=0.5)(render_live_results)
+
+
+SESSIONS_PAGE_SIZE = 20
 
 
 def render_sessions_ui():
     with st.sidebar.expander("Sessions", expanded=False):
-        name = st.text_input("Session name", value="")
+        # Saving again under the same name only writes the tasks that changed since the last save.
+        name = st.text_input("Session name", value=st.session_state.get("session_name") or "")
         if st.button("💾 Save Session"):
             session = {
                 "name": name or None,
+                "student": current_student(),
                 "code": st.session_state.code,
                 "results": st.session_state.results,
             }
-            p = save_session(session)
-            st.success(f"Saved: {p.name}")
+            st.session_state.session_name = save_session(session)
+            st.success(f"Saved: {st.session_state.session_name}")
         st.write("Available:")
-        files = list_sessions()
-        if files:
-            choice = st.selectbox("Load", [None] + files)
+        query = st.text_input("Filter by name", value="", key="session_query")
+        total = count_sessions(query)
+        if total:
+            pages = (total + SESSIONS_PAGE_SIZE - 1) // SESSIONS_PAGE_SIZE
+            page = st.number_input("Page", min_value=1, max_value=pages, value=1) if pages > 1 else 1
+            infos = list_sessions(query, limit=SESSIONS_PAGE_SIZE, offset=(int(page) - 1) * SESSIONS_PAGE_SIZE)
+            labels = {s.name: f"{s.name} · {datetime.fromtimestamp(s.updated):%Y-%m-%d %H:%M} · {s.tasks} task(s)" for s in infos}
+            choice = st.selectbox("Load", [None] + list(labels), format_func=lambda n: labels.get(n, "—"))
+            st.caption(f"{total} session(s), newest first")
             if choice and st.button("📂 Load Selected"):
                 data = load_session(choice)
                 st.session_state.code = data.get("code", {})
                 st.session_state.results = data.get("results", {})
+                st.session_state.session_name = choice
+                st.session_state.student_id = data.get("student") or choice
                 st.success("Session loaded")
         else:
             st.caption("No sessions yet")
 
 
+def _pct(value) -> str:
+    return "—" if value is None else f"{value:.0%}"
+
+
+def _num(value, fmt: str = "{:.1f}") -> str:
+    return "—" if value is None else fmt.format(value)
+
+
+STUDENTS_PAGE_SIZE = 50
+
+
+def render_dashboard():
+    st.markdown("### 📈 Progress")
+    analytics = get_analytics()
+    if st.button("🔄 Import saved sessions"):
+        n = analytics.ingest_sessions(get_session_store())
+        st.success(f"Imported {n} result(s) from saved sessions")
+
+    st.markdown(f"#### Your tasks ({current_student()})")
+    mine = analytics.student_tasks(current_student())
+    if mine:
+        st.dataframe([
+            {
+                "Task": r["task_id"],
+                "Attempts": r["attempts"],
+                "Last pass rate": _pct(r["last_pass_rate"]),
+                "Attempts to solve": r["attempts_to_solve"] or "—",
+                "Minutes to solve": _num(r["minutes_to_solve"]),
+            }
+            for r in mine
+        ], use_container_width=True)
+    else:
+        st.caption("No runs yet")
+
+    st.markdown("#### Tasks")
+    tasks = analytics.task_summary()
+    if not tasks:
+        st.caption("No runs recorded yet")
+        return
+    st.dataframe([
+        {
+            "Task": r["task_id"],
+            "Runs": r["runs"],
+            "Students": r["students"],
+            "Avg pass rate": _pct(r["avg_pass_rate"]),
+            "Solved by": _pct(r["solve_rate"]),
+            "Avg attempts to solve": _num(r["avg_attempts_to_solve"]),
+            "Avg minutes to solve": _num(r["avg_minutes_to_solve"]),
+        }
+        for r in tasks
+    ], use_container_width=True)
+    task_id = st.selectbox("Most failed test cases for", [r["task_id"] for r in tasks])
+    for f in analytics.common_failures(task_id):
+        st.write(f"❌ {f['description']} — failed {f['failures']} time(s)")
+
+    st.markdown("#### Students")
+    query = st.text_input("Filter students", value="", key="student_query")
+    total = analytics.count_students(query)
+    pages = max((total + STUDENTS_PAGE_SIZE - 1) // STUDENTS_PAGE_SIZE, 1)
+    page = st.number_input("Page", min_value=1, max_value=pages, value=1, key="student_page") if pages > 1 else 1
+    st.dataframe([
+        {
+            "Student": r["student"],
+            "Runs": r["runs"],
+            "Avg pass rate": _pct(r["avg_pass_rate"]),
+            "Tasks attempted": r["tasks_attempted"],
+            "Tasks solved": r["tasks_solved"],
+            "Last active": f"{datetime.fromtimestamp(r['last_active']):%Y-%m-%d %H:%M}",
+        }
+        for r in analytics.student_summary(query, limit=STUDENTS_PAGE_SIZE, offset=(int(page) - 1) * STUDENTS_PAGE_SIZE)
+    ], use_container_width=True)
+    st.caption(f"{total} student(s), most recently active first")
+
+
 def main():
     cfg = render_settings(st.session_state.config)
     st.session_state.config = cfg
 
     render_header()
-    tasks = get_tasks()
-    task = render_task_selector(tasks)
+    if st.sidebar.radio("Page", ["Practice", "Progress"], horizontal=True) == "Progress":
+        render_dashboard()
+        render_sessions_ui()
+        return
+    task = render_task_selector()
 
     user_code = render_editor(task, cfg)
     render_actions(task, cfg, user_code)
-    render_results(task)
+    if cfg.live_mode:
+        submit_live_run(task, cfg, user_code)
+        render_live_results(task)
+    else:
+        stop_live_runs()
+        render_results(task)
     render_sessions_ui()
+    # Last: reading the streams blocks this script run until the answers are complete, so
+    # everything else (results, sidebar) is already on the page while they arrive.
+    render_llm_answers(task, cfg)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,233 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from config import get_default_config
+from evaluator import evaluate_solution
+from pool import configure_pool
+from storage import SESSIONS_DIR, get_session_store
+from tasks import list_tasks, load_task
+from utils import percentile
+
+FIELDS = ["session", "task_id", "success", "pass_count", "total", "error", "latency_ms", "graded_at"]
+
+# Submissions in flight per worker process; keeps memory flat for arbitrarily large cohorts.
+_INFLIGHT_PER_WORKER = 4
+
+# Error prefix of rows whose grading process died (not the submission); a resumed run grades them again.
+WORKER_FAILED = "Grading worker failed"
+
+
+def iter_submissions(sessions_dir: Path, task_ids: Set[str]) -> Iterator[Tuple[str, str, str]]:
+    """Yield (session, task_id, code) for every saved session, streamed from the session store."""
+    return get_session_store(sessions_dir).iter_code(task_ids)
+
+
+def _new_executor(workers: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+
+
+def _init_worker() -> None:
+    # Each grading process runs one submission at a time, so one warm interpreter is enough.
+    cfg = get_default_config()
+    configure_pool(1 if cfg.runner_pool_size > 0 else 0, cfg.runner_pool_max_jobs)
+
+
+def _grade(session: str, task_id: str, code: str, timeout_seconds: int, use_cache: bool) -> Dict[str, Any]:
+    started = time.perf_counter()
+    # Tasks are loaded on first use and cached per process by tasks.load_task.
+    task = load_task(task_id)
+    res = evaluate_solution(code, task, timeout_seconds=timeout_seconds, use_cache=use_cache)
+    return {
+        "session": session,
+        "task_id": task_id,
+        "success": bool(res.get("success")),
+        "pass_count": res.get("pass_count", 0),
+        "total": res.get("total", len(task.tests)),
+        "error": res.get("error"),
+        "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+        "graded_at": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+class ResultWriter:
+    """Appends rows as JSONL or CSV, flushing after each one so a crash loses at most one row."""
+
+    def __init__(self, path: Path, fmt: str):
+        self.path = path
+        self.fmt = fmt
+        self.done = self._recover()
+        new_file = not path.exists() or path.stat().st_size == 0
+        self._f = open(path, "a", encoding="utf-8", newline="")
+        self._csv = csv.DictWriter(self._f, fieldnames=FIELDS) if fmt == "csv" else None
+        if self._csv is not None and new_file:
+            self._csv.writeheader()
+
+    def _recover(self) -> Set[Tuple[str, str]]:
+        """Drop a torn last line left by a crash and return the (session, task_id) pairs already graded.
+
+        Rows of failed grading processes are left out, so they are graded again.
+        """
+        if not self.path.exists():
+            return set()
+        data = self.path.read_bytes()
+        if data and not data.endswith(b"\n"):
+            data = data[: data.rfind(b"\n") + 1]
+            with open(self.path, "wb") as f:
+                f.write(data)
+        text = data.decode("utf-8")
+        if self.fmt == "csv":
+            rows: Iterable[Dict[str, Any]] = csv.DictReader(text.splitlines())
+        else:
+            rows = (json.loads(line) for line in text.splitlines() if line.strip())
+        return {
+            (row["session"], row["task_id"]) for row in rows if not str(row.get("error") or "").startswith(WORKER_FAILED)
+        }
+
+    def write(self, row: Dict[str, Any]) -> None:
+        if self._csv is not None:
+            self._csv.writerow(row)
+        else:
+            self._f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self._f.flush()
+
+    def close(self) -> None:
+        self._f.close()
+
+
+def run_batch(
+    out_path: Path,
+    fmt: str = "jsonl",
+    sessions_dir: Path = SESSIONS_DIR,
+    task_ids: Optional[Set[str]] = None,
+    workers: Optional[int] = None,
+    timeout_seconds: Optional[int] = None,
+    use_cache: bool = False,
+    progress_every: int = 100,
+) -> Dict[str, Any]:
+    cfg = get_default_config()
+    workers = workers or os.cpu_count() or 2
+    timeout_seconds = timeout_seconds or cfg.execution_timeout_seconds
+    task_ids = task_ids or {t.id for t in list_tasks()}
+
+    writer = ResultWriter(out_path, fmt)
+    skipped = 0
+    graded = 0
+    worker_errors = 0
+    latencies: List[float] = []
+    passed = 0
+    started = time.perf_counter()
+    # In-flight futures -> (session, task_id), so a failed one still gets its row.
+    pending: Dict[Future, Tuple[str, str]] = {}
+
+    def collect(done: Iterable[Future]) -> bool:
+        """Write a row per finished future; returns True when a grading process died and broke the pool."""
+        nonlocal graded, worker_errors, passed
+        broken = False
+        for fut in done:
+            session, task_id = pending.pop(fut)
+            try:
+                row = fut.result()
+            except Exception as e:
+                # Only a dead process is worth retrying; any other exception (an unknown task, a bug
+                # in grading) would fail the same way again, so it is an ordinary, final error row.
+                died = isinstance(e, BrokenProcessPool)
+                broken = broken or died
+                worker_errors += died
+                row = {
+                    "session": session,
+                    "task_id": task_id,
+                    "success": False,
+                    "pass_count": 0,
+                    "total": 0,
+                    "error": f"{WORKER_FAILED}: {type(e).__name__}: {e}" if died else f"{type(e).__name__}: {e}",
+                    "latency_ms": None,
+                    "graded_at": datetime.now().isoformat(timespec="seconds"),
+                }
+            else:
+                latencies.append(row["latency_ms"])
+                passed += row["success"] and row["pass_count"] == row["total"]
+            writer.write(row)
+            graded += 1
+            if progress_every and graded % progress_every == 0:
+                elapsed = time.perf_counter() - started
+                print(f"{graded} graded, {graded / elapsed:.1f}/s", file=sys.stderr)
+        return broken
+
+    def restart(executor: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        # Every future of a broken pool fails; write their rows and grade the rest on a fresh pool.
+        collect(wait(pending)[0])
+        executor.shutdown(wait=False)
+        print("grading process died; restarting the worker pool", file=sys.stderr)
+        return _new_executor(workers)
+
+    executor = _new_executor(workers)
+    try:
+        for session, task_id, code in iter_submissions(sessions_dir, task_ids):
+            if (session, task_id) in writer.done:
+                skipped += 1
+                continue
+            try:
+                fut = executor.submit(_grade, session, task_id, code, timeout_seconds, use_cache)
+            except BrokenProcessPool:
+                executor = restart(executor)
+                fut = executor.submit(_grade, session, task_id, code, timeout_seconds, use_cache)
+            pending[fut] = (session, task_id)
+            if len(pending) >= workers * _INFLIGHT_PER_WORKER:
+                if collect(wait(pending, return_when=FIRST_COMPLETED)[0]):
+                    executor = restart(executor)
+        collect(wait(pending)[0])
+    finally:
+        executor.shutdown()
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "graded": graded,
+        "worker_errors": worker_errors,
+        "skipped": skipped,
+        "fully_passed": passed,
+        "workers": workers,
+        "elapsed_s": round(elapsed, 3),
+        "submissions_per_s": round(graded / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency_p50_ms": percentile(latencies, 50),
+        "latency_p95_ms": percentile(latencies, 95),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Regrade saved sessions against the task bank in parallel.")
+    parser.add_argument("--out", required=True, help="Output file (.jsonl or .csv); rerun with the same file to resume.")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default=None, help="Defaults to the --out file suffix.")
+    parser.add_argument("--sessions-dir", default=str(SESSIONS_DIR))
+    parser.add_argument("--tasks", default="", help="Comma-separated task ids (default: all tasks).")
+    parser.add_argument("--workers", type=int, default=None, help="Grading processes (default: CPU count).")
+    parser.add_argument("--timeout", type=int, default=None, help="Per-submission timeout in seconds.")
+    parser.add_argument("--use-cache", action="store_true", help="Reuse cached results for unchanged submissions.")
+    args = parser.parse_args()
+
+    out_path = Path(args.out)
+    fmt = args.format or ("csv" if out_path.suffix.lower() == ".csv" else "jsonl")
+    task_ids = {t.strip() for t in args.tasks.split(",") if t.strip()} or None
+    stats = run_batch(
+        out_path,
+        fmt=fmt,
+        sessions_dir=Path(args.sessions_dir),
+        task_ids=task_ids,
+        workers=args.workers,
+        timeout_seconds=args.timeout,
+        use_cache=args.use_cache,
+    )
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
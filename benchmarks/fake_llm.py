@@ -0,0 +1,259 @@
+"""Local stand-in for the OpenAI and Ollama chat endpoints, for load tests without a real model.
+
+    python benchmarks/fake_llm.py --port 11500 --ttft-ms 300 --token-ms 20 --tokens 60
+    OPENAI_BASE_URL=http://127.0.0.1:11500/v1 OPENAI_API_KEY=fake streamlit run app.py
+    OLLAMA_BASE_URL=http://127.0.0.1:11500 ...
+
+Serves POST /v1/chat/completions (JSON or SSE stream), POST /api/chat and /api/generate (JSON or
+NDJSON stream), GET /v1/models, GET /api/tags, and GET /stats with request counters.
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator
+
+_WORDS = (
+    "Consider what happens for the smallest input and check that your loop visits every element "
+    "exactly once before returning the accumulated value to the caller"
+).split()
+
+
+class FakeLLMSettings:
+    def __init__(self, ttft_ms: float, token_ms: float, tokens: int, jitter: float, error_rate: float, max_active: int):
+        self.ttft_ms = ttft_ms
+        self.token_ms = token_ms
+        self.tokens = tokens
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.max_active = max_active
+
+    def delay(self, ms: float) -> None:
+        if ms > 0:
+            time.sleep(ms * (1 + random.uniform(-self.jitter, self.jitter)) / 1000)
+
+
+class _Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.active = 0
+        self.peak_active = 0
+        self.rejected = 0
+        self.errors = 0
+
+    def snapshot(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "active": self.active,
+                "peak_active": self.peak_active,
+                "rejected": self.rejected,
+                "errors": self.errors,
+            }
+
+
+def _tokens(count: int) -> Iterator[str]:
+    for i in range(count):
+        yield _WORDS[i % len(_WORDS)] + " "
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    settings: FakeLLMSettings
+    stats: _Stats
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_stream(self, content_type: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, text: str) -> None:
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _end_stream(self) -> None:
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def do_GET(self) -> None:
+        if self.path == "/stats":
+            self._send_json(200, self.stats.snapshot())
+        elif self.path.startswith("/v1/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "fake", "object": "model", "owned_by": "local"}]})
+        elif self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": "fake", "model": "fake"}]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": "invalid JSON"})
+            return
+        routes = {
+            "/v1/chat/completions": self._openai_chat,
+            "/chat/completions": self._openai_chat,
+            "/api/chat": self._ollama,
+            "/api/generate": self._ollama,
+        }
+        route = routes.get(self.path.split("?")[0])
+        if route is None:
+            self._send_json(404, {"error": "not found"})
+            return
+        s = self.settings
+        with self.stats.lock:
+            self.stats.requests += 1
+            if s.max_active and self.stats.active >= s.max_active:
+                self.stats.rejected += 1
+                overloaded = True
+            else:
+                self.stats.active += 1
+                self.stats.peak_active = max(self.stats.peak_active, self.stats.active)
+                overloaded = False
+        if overloaded:
+            self._send_json(429, {"error": {"message": "rate limited", "type": "rate_limit_error"}})
+            return
+        try:
+            if random.random() < s.error_rate:
+                with self.stats.lock:
+                    self.stats.errors += 1
+                self._send_json(503, {"error": {"message": "injected failure", "type": "server_error"}})
+                return
+            route(request)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with self.stats.lock:
+                self.stats.active -= 1
+
+    def _openai_chat(self, request: Dict[str, Any]) -> None:
+        s = self.settings
+        model = request.get("model", "fake")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        usage = {"prompt_tokens": 100, "completion_tokens": s.tokens, "total_tokens": 100 + s.tokens}
+        s.delay(s.ttft_ms)
+        if not request.get("stream"):
+            s.delay(s.token_ms * s.tokens)
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(_tokens(s.tokens))}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        def chunk(delta: Dict[str, Any], finish_reason: Any = None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        self._start_stream("text/event-stream")
+        self._write_chunk(chunk({"role": "assistant", "content": ""}))
+        for i, token in enumerate(_tokens(s.tokens)):
+            if i:
+                s.delay(s.token_ms)
+            self._write_chunk(chunk({"content": token}))
+        self._write_chunk(chunk({}, "stop"))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            payload = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model, "choices": [], "usage": usage}
+            self._write_chunk(f"data: {json.dumps(payload)}\n\n")
+        self._write_chunk("data: [DONE]\n\n")
+        self._end_stream()
+
+    def _ollama(self, request: Dict[str, Any]) -> None:
+        s = self.settings
+        chat = self.path.startswith("/api/chat")
+        model = request.get("model", "fake")
+
+        def message(text: str, done: bool) -> Dict[str, Any]:
+            payload: Dict[str, Any] = {"model": model, "created_at": datetime.now(timezone.utc).isoformat(), "done": done}
+            if chat:
+                payload["message"] = {"role": "assistant", "content": text}
+            else:
+                payload["response"] = text
+            if done:
+                payload.update(
+                    done_reason="stop",
+                    total_duration=int((s.ttft_ms + s.token_ms * s.tokens) * 1e6),
+                    load_duration=0,
+                    prompt_eval_count=100,
+                    prompt_eval_duration=int(s.ttft_ms * 1e6),
+                    eval_count=s.tokens,
+                    eval_duration=int(s.token_ms * s.tokens * 1e6),
+                )
+            return payload
+
+        s.delay(s.ttft_ms)
+        if request.get("stream") is False:
+            s.delay(s.token_ms * s.tokens)
+            self._send_json(200, message("".join(_tokens(s.tokens)), True))
+            return
+        self._start_stream("application/x-ndjson")
+        for i, token in enumerate(_tokens(s.tokens)):
+            if i:
+                s.delay(s.token_ms)
+            self._write_chunk(json.dumps(message(token, False)) + "\n")
+        self._write_chunk(json.dumps(message("", True)) + "\n")
+        self._end_stream()
+
+
+def make_server(host: str, port: int, settings: FakeLLMSettings) -> ThreadingHTTPServer:
+    handler = type("FakeLLMHandler", (_Handler,), {"settings": settings, "stats": _Stats()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Fake OpenAI/Ollama chat server with configurable latency.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500, help="0 picks a free port.")
+    parser.add_argument("--ttft-ms", type=float, default=300.0, help="Delay before the first token.")
+    parser.add_argument("--token-ms", type=float, default=20.0, help="Delay between streamed tokens.")
+    parser.add_argument("--tokens", type=int, default=60, help="Tokens per answer.")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Relative random variation of every delay.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503.")
+    parser.add_argument("--max-active", type=int, default=0, help="Answer 429 above this many concurrent requests (0: no limit).")
+    args = parser.parse_args()
+    settings = FakeLLMSettings(args.ttft_ms, args.token_ms, args.tokens, args.jitter, args.error_rate, args.max_active)
+    server = make_server(args.host, args.port, settings)
+    # The first stdout line announces the bound address (useful with --port 0).
+    print(f"http://{args.host}:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
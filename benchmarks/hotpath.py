@@ -0,0 +1,213 @@
+"""Micro-benchmarks for the grading hot path. Runs offline and reports p50/p95/p99 per benchmark as JSON.
+
+    python benchmarks/hotpath.py --out bench.json
+    python benchmarks/hotpath.py --save-baseline benchmarks/baseline.json  # first, on the commit to compare against
+    python benchmarks/hotpath.py --compare benchmarks/baseline.json       # exits 1 on a regression
+    python benchmarks/hotpath.py --quick --only harness_build,parse_events
+
+Benchmarks:
+  harness_build/{small,huge}   evaluator._build_harness for a bank task and for a synthetic 5000-case task
+  launch/{pool,cold}           runner.run_harness of an empty program, forked from a warm worker or cold-started
+  parse_events/huge            _EventParser over the captured stdout of the 5000-case harness
+  evaluate/<task>/{pass,fail,timeout}
+                               evaluate_solution end to end for every task in the bank, uncached
+
+Passing submissions answer from a lookup table of the task's own tests, so any task works without
+a reference solution. Baselines are machine specific, so none is committed; record one on the machine
+that compares against it.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import get_default_config  # noqa: E402
+from evaluator import _EventParser, _build_harness, evaluate_solution  # noqa: E402
+from pool import configure_pool, shutdown_pool  # noqa: E402
+from runner import run_harness, run_python_in_subprocess  # noqa: E402
+from tasks import Task, TestCase, get_tasks  # noqa: E402
+from utils import percentile  # noqa: E402
+
+HUGE_SUITE_SIZE = 5000
+PARSE_CHUNK_CHARS = 64 * 1024
+
+
+def table_solution(task: Task) -> str:
+    """A submission passing every case of task by looking its arguments up in a table."""
+    table = {json.dumps([tc.input_args, tc.input_kwargs], sort_keys=True): tc.expected_output for tc in task.tests}
+    return (
+        "import json\n"
+        f"_TABLE = json.loads({json.dumps(json.dumps(table))})\n"
+        f"def {task.function_name}(*args, **kwargs):\n"
+        "    return _TABLE.get(json.dumps([list(args), kwargs], sort_keys=True))\n"
+    )
+
+
+def failing_solution(task: Task) -> str:
+    return f"def {task.function_name}(*args, **kwargs):\n    return object()\n"
+
+
+def hanging_solution(task: Task) -> str:
+    return f"def {task.function_name}(*args, **kwargs):\n    while True:\n        pass\n"
+
+
+def huge_task() -> Task:
+    tests = [TestCase(f"case {i}", [i, i + 1], {}, 2 * i + 1) for i in range(HUGE_SUITE_SIZE)]
+    return Task(
+        id="bench_huge",
+        title="Benchmark: add",
+        description="Synthetic task with a large test suite.",
+        function_name="add",
+        starter_code="def add(a, b):\n    pass",
+        tests=tests,
+    )
+
+
+def measure(fn: Callable[[], Any], iterations: int, warmup: int = 1) -> List[float]:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    return {
+        "n": len(samples),
+        "mean_ms": sum(samples) / len(samples),
+        "p50_ms": percentile(samples, 50),
+        "p95_ms": percentile(samples, 95),
+        "p99_ms": percentile(samples, 99),
+    }
+
+
+def run_benchmarks(quick: bool, only: Optional[List[str]], timeout_seconds: int) -> Dict[str, Dict[str, float]]:
+    scale = 0.1 if quick else 1.0
+
+    def n(count: int) -> int:
+        return max(3, int(count * scale))
+
+    def wanted(name: str) -> bool:
+        return not only or any(name.startswith(prefix) for prefix in only)
+
+    tasks = get_tasks()
+    huge = huge_task()
+    cfg = get_default_config()
+    results: Dict[str, Dict[str, float]] = {}
+
+    def record(name: str, fn: Callable[[], Any], iterations: int, warmup: int = 1) -> None:
+        if wanted(name):
+            print(f"  {name} x{iterations}", file=sys.stderr, flush=True)
+            results[name] = summarize(measure(fn, iterations, warmup))
+
+    small = tasks[0]
+    small_code = table_solution(small)
+    record("harness_build/small", lambda: _build_harness(small_code, small), n(2000))
+    huge_code = table_solution(huge)
+    record("harness_build/huge", lambda: _build_harness(huge_code, huge), n(50))
+
+    configure_pool(max(1, cfg.runner_pool_size), cfg.runner_pool_max_jobs)
+    record("launch/pool", lambda: run_harness("pass\n", 10), n(100))
+    configure_pool(0, 0)
+    record("launch/cold", lambda: run_harness("pass\n", 10), n(30))
+    configure_pool(max(1, cfg.runner_pool_size), cfg.runner_pool_max_jobs)
+
+    if wanted("parse_events"):
+        # The returned stdout is cut to head + tail; the stream itself is complete.
+        chunks: List[str] = []
+        run_python_in_subprocess(_build_harness(huge_code, huge), 60, chunks.append)
+        stdout = "".join(chunks)
+
+        def parse() -> None:
+            parser = _EventParser()
+            for start in range(0, len(stdout), PARSE_CHUNK_CHARS):
+                parser.feed(stdout[start:start + PARSE_CHUNK_CHARS])
+            parser.close()
+            assert parser.pass_count == HUGE_SUITE_SIZE, "benchmark harness did not pass every case"
+
+        record("parse_events/huge", parse, n(30))
+
+    for task in tasks:
+        for outcome, code, iterations in (
+            ("pass", table_solution(task), n(30)),
+            ("fail", failing_solution(task), n(30)),
+            ("timeout", hanging_solution(task), max(1, int(3 * scale))),
+        ):
+            record(
+                f"evaluate/{task.id}/{outcome}",
+                lambda code=code, task=task: evaluate_solution(code, task, timeout_seconds, use_cache=False),
+                iterations,
+                warmup=0 if outcome == "timeout" else 1,
+            )
+    shutdown_pool()
+    return results
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, min_delta_ms: float) -> List[str]:
+    """Benchmarks whose p50 or p95 grew by more than tolerance (and min_delta_ms) over baseline."""
+    regressions = []
+    for name, stats in sorted(current["benchmarks"].items()):
+        base = baseline.get("benchmarks", {}).get(name)
+        if base is None:
+            continue
+        for key in ("p50_ms", "p95_ms"):
+            if stats[key] > base[key] * (1 + tolerance) and stats[key] - base[key] > min_delta_ms:
+                regressions.append(f"{name} {key}: {base[key]:.3f} -> {stats[key]:.3f} ms (+{stats[key] / base[key] - 1:.0%})")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the grading hot path.")
+    parser.add_argument("--out", help="Write the JSON report here (default: stdout).")
+    parser.add_argument("--compare", help="Baseline JSON to compare against; exit 1 on regression.")
+    parser.add_argument("--save-baseline", help="Also write the report to this baseline file.")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed relative slowdown of p50/p95 (shared machines are noisy).")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5, help="Ignore slowdowns smaller than this.")
+    parser.add_argument("--timeout", type=int, default=1, help="Execution timeout for evaluate/* runs.")
+    parser.add_argument("--quick", action="store_true", help="A tenth of the iterations, for a smoke run.")
+    parser.add_argument("--only", default="", help="Comma-separated benchmark name prefixes.")
+    args = parser.parse_args()
+
+    if args.compare and not Path(args.compare).exists():
+        parser.error(f"no baseline at {args.compare}; record one first with --save-baseline {args.compare}")
+    only = [p for p in args.only.split(",") if p]
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "quick": args.quick,
+            "timeout_seconds": args.timeout,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "benchmarks": run_benchmarks(args.quick, only, args.timeout),
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(text + "\n", encoding="utf-8")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = compare(report, baseline, args.tolerance, args.min_delta_ms)
+        for line in regressions:
+            print(f"REGRESSION: {line}", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"no regressions against {args.compare}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,415 @@
+"""Multi-user load simulator: how many concurrent students can one app instance serve?
+
+    python benchmarks/loadsim.py --users 1,2,4,8,16 --step-seconds 30 --out load.json
+    python benchmarks/loadsim.py --provider Ollama --ttft-ms 800 --token-ms 40 --think-ms 1500
+    python benchmarks/loadsim.py --llm-url http://127.0.0.1:11500      # use an already running fake server
+
+Each simulated student is a thread in this process, like a Streamlit session, and drives the same
+calls as app.render_actions: Run Tests (evaluate_solution + analytics), Get Hint / Explain Code
+(prompt building + stream_llm, read to the end) and session save / load. Students pause for an
+exponentially distributed think time between actions.
+
+LLM traffic goes to benchmarks/fake_llm.py, started as a subprocess unless --llm-url is given, via
+OPENAI_BASE_URL / OLLAMA_BASE_URL. Sessions, analytics and the result and LLM answer caches go to a
+scratch directory, never to sessions/ or .cache/, and every run mixes a fresh nonce into its edits,
+so neither a previous run nor the app's own caches can answer for it.
+
+For every step of the user ramp the report has throughput, latency percentiles per action, LLM time
+to first token, error rate, and peak process count and RSS. It also has an RSS and process timeline
+sampled throughout, and the saturation point: the last user count before adding users stopped
+raising throughput or pushed errors or Run Tests p95 past their limits.
+"""
+import argparse
+import json
+import os
+import random
+import secrets
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from analytics import AnalyticsStore  # noqa: E402
+from cache import configure_result_cache  # noqa: E402
+from config import get_default_config  # noqa: E402
+from evaluator import evaluate_solution  # noqa: E402
+from hotpath import failing_solution, table_solution  # noqa: E402
+from llm import build_explain_prompt, build_hint_prompt, configure_llm_cache, stream_llm  # noqa: E402
+from storage import SessionStore  # noqa: E402
+from tasks import Task, get_tasks  # noqa: E402
+from utils import percentile  # noqa: E402
+
+ACTIONS = ("run", "hint", "explain", "save", "load")
+DEFAULT_MIX = "run=6,hint=2,explain=1,save=1,load=1"
+SAMPLE_INTERVAL_SECONDS = 0.5
+
+# Run Tests errors that mean the instance, not the submission, failed.
+_OVERLOAD_ERRORS = ("Timeout after", "Grading service is busy", "Runner error")
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ACTIONS:
+            raise ValueError(f"unknown action {name!r}; expected one of {', '.join(ACTIONS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def _read_proc(path: str) -> Optional[str]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _rss_mb(pid: int) -> float:
+    status = _read_proc(f"/proc/{pid}/status") or ""
+    for line in status.splitlines():
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _descendants(root: int) -> List[int]:
+    """Every live process below root (pool workers and the children they fork), via /proc."""
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc") if os.path.isdir("/proc") else []:
+        if not entry.isdigit():
+            continue
+        stat = _read_proc(f"/proc/{entry}/stat")
+        if stat:
+            # The command name may contain spaces; fields after it are fixed.
+            ppid = int(stat.rsplit(")", 1)[1].split()[1])
+            children.setdefault(ppid, []).append(int(entry))
+    found, stack = [], [root]
+    while stack:
+        for pid in children.get(stack.pop(), []):
+            found.append(pid)
+            stack.append(pid)
+    return found
+
+
+class Sampler:
+    """Samples this process's RSS, its descendants' RSS and their count in the background."""
+
+    def __init__(self):
+        self.samples: List[Dict[str, float]] = []
+        self.step_users = 0
+        self._stop = threading.Event()
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="loadsim-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        me = os.getpid()
+        while not self._stop.wait(SAMPLE_INTERVAL_SECONDS):
+            descendants = _descendants(me)
+            self.samples.append({
+                "t": round(time.perf_counter() - self._started, 2),
+                "users": self.step_users,
+                "rss_mb": round(_rss_mb(me), 1),
+                "children_rss_mb": round(sum(_rss_mb(pid) for pid in descendants), 1),
+                "processes": len(descendants),
+                "threads": threading.active_count(),
+            })
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.events: List[Dict[str, Any]] = []
+
+    def add(self, action: str, ms: float, ok: bool, ttft_ms: Optional[float] = None) -> None:
+        with self._lock:
+            self.events.append({"action": action, "ms": ms, "ok": ok, "ttft_ms": ttft_ms})
+
+    def drain(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            events, self.events = self.events, []
+        return events
+
+
+class SimStudent:
+    """One simulated browser session working through tasks."""
+
+    def __init__(
+        self, uid: int, tasks: List[Task], store: SessionStore, analytics: AnalyticsStore, args: argparse.Namespace, nonce: str
+    ):
+        self.name = f"loadsim-{uid}"
+        # Unique per run and step: the seed makes every run generate the same code otherwise.
+        self.nonce = nonce
+        self.tasks = tasks
+        self.store = store
+        self.analytics = analytics
+        self.args = args
+        self.rng = random.Random(args.seed * 1000 + uid)
+        self.code: Dict[str, str] = {}
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.saved = False
+        self.edits = 0
+        self.task = self.rng.choice(tasks)
+
+    def _edit(self, task: Task) -> str:
+        """New editor contents: mostly starter or wrong code, sometimes a correct answer."""
+        if task.id in self.code and self.rng.random() < self.args.repeat_code:
+            return self.code[task.id]
+        self.edits += 1
+        base = self.rng.choices(
+            [task.starter_code, failing_solution(task), table_solution(task)], weights=[3, 3, 2]
+        )[0]
+        # A distinct constant changes the AST, so the result cache cannot answer it; the code is part of
+        # the hint and explain prompts, so the LLM answer cache cannot either.
+        code = f"{base}\n\n_edit = {self.nonce!r}, {self.edits}\n"
+        self.code[task.id] = code
+        return code
+
+    def act(self, action: str, cfg, recorder: Recorder) -> None:
+        if self.rng.random() < 0.1:
+            self.task = self.rng.choice(self.tasks)
+        task = self.task
+        if action == "load" and not self.saved:
+            action = "save"
+        started = time.perf_counter()
+        ok, ttft = True, None
+        if action == "run":
+            code = self._edit(task)
+            res = evaluate_solution(
+                code, task, timeout_seconds=int(cfg.execution_timeout_seconds), code_runner=cfg.code_runner,
+                on_result=lambda detail: None, fail_fast=cfg.fail_fast,
+            )
+            self.results[task.id] = res
+            self.analytics.record_run(self.name, task.id, res)
+            ok = res.get("success") or not str(res.get("error", "")).startswith(_OVERLOAD_ERRORS)
+        elif action in ("hint", "explain"):
+            code = self.code.get(task.id) or self._edit(task)
+            if action == "hint":
+                details = (self.results.get(task.id) or {}).get("details") or []
+                prompt = build_hint_prompt(task.title, task.description, details, code, task.function_name)
+            else:
+                prompt = build_explain_prompt(task.title, task.description, code, task.function_name)
+            stream = stream_llm(self.args.provider, self.args.model, cfg.ai_temperature, prompt)
+            for _ in stream:
+                pass
+            # Unconfigured, the app shows its "not configured" notice: that is an answer, not an error.
+            ok = not stream.text.startswith("LLM error")
+            ttft = stream.ttft_ms
+        elif action == "save":
+            self.store.save(self.name, {"code": self.code, "results": self.results}, self.name)
+            self.saved = True
+        else:
+            self.store.load(self.name)
+        recorder.add(action, (time.perf_counter() - started) * 1000, bool(ok), ttft)
+
+    def loop(self, stop: threading.Event, mix: Dict[str, float], cfg, recorder: Recorder) -> None:
+        actions, weights = list(mix), list(mix.values())
+        while not stop.is_set():
+            # Think time first, so users entering a step do not all fire at once.
+            if stop.wait(self.rng.expovariate(1000 / self.args.think_ms) if self.args.think_ms > 0 else 0):
+                return
+            try:
+                self.act(self.rng.choices(actions, weights)[0], cfg, recorder)
+            except Exception as e:
+                recorder.add("error", 0.0, False)
+                print(f"{self.name}: {type(e).__name__}: {e}", file=sys.stderr)
+
+
+def summarize_step(users: int, seconds: float, events: List[Dict[str, Any]], samples: List[Dict[str, float]]) -> Dict[str, Any]:
+    latency = {}
+    for action in ACTIONS:
+        values = [e["ms"] for e in events if e["action"] == action]
+        if values:
+            latency[action] = {
+                "n": len(values),
+                "p50_ms": percentile(values, 50),
+                "p95_ms": percentile(values, 95),
+                "p99_ms": percentile(values, 99),
+            }
+    ttfts = [e["ttft_ms"] for e in events if e["ttft_ms"] is not None]
+    errors = sum(1 for e in events if not e["ok"])
+    step_samples = [s for s in samples if s["users"] == users]
+    return {
+        "users": users,
+        "seconds": seconds,
+        "actions": len(events),
+        "throughput_per_s": len(events) / seconds if seconds else 0.0,
+        "errors": errors,
+        "error_rate": errors / len(events) if events else 0.0,
+        "latency": latency,
+        "llm_ttft_ms": {"p50": percentile(ttfts, 50), "p95": percentile(ttfts, 95)} if ttfts else None,
+        "peak_processes": max((s["processes"] for s in step_samples), default=0),
+        "peak_rss_mb": max((s["rss_mb"] + s["children_rss_mb"] for s in step_samples), default=0.0),
+    }
+
+
+def find_saturation(steps: List[Dict[str, Any]], min_gain: float, max_error_rate: float, run_p95_limit_ms: float) -> Dict[str, Any]:
+    """The largest user count the instance still served well, and why the next step was worse."""
+    best: Optional[Dict[str, Any]] = None
+    for step in steps:
+        run_p95 = step["latency"].get("run", {}).get("p95_ms", 0.0)
+        reason = None
+        if step["error_rate"] > max_error_rate:
+            reason = f"error rate {step['error_rate']:.1%} above {max_error_rate:.1%}"
+        elif run_p95 > run_p95_limit_ms:
+            reason = f"Run Tests p95 {run_p95:.0f} ms above {run_p95_limit_ms:.0f} ms"
+        elif best is not None and step["throughput_per_s"] < best["throughput_per_s"] * (1 + min_gain):
+            reason = (
+                f"throughput {step['throughput_per_s']:.2f}/s at {step['users']} users is less than "
+                f"{min_gain:.0%} above {best['throughput_per_s']:.2f}/s at {best['users']}"
+            )
+        if reason is not None:
+            return {"users": best["users"] if best else 0, "saturated_at": step["users"], "reason": reason}
+        best = step
+    return {"users": best["users"] if best else 0, "saturated_at": None, "reason": "not reached; ramp to more users"}
+
+
+def start_fake_llm(args: argparse.Namespace) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [
+            sys.executable, str(Path(__file__).resolve().parent / "fake_llm.py"), "--port", "0",
+            "--ttft-ms", str(args.ttft_ms), "--token-ms", str(args.token_ms), "--tokens", str(args.tokens),
+            "--error-rate", str(args.llm_error_rate),
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    return proc
+
+
+def fetch_stats(url: str) -> Optional[Dict[str, Any]]:
+    try:
+        with urllib.request.urlopen(url.rstrip("/") + "/stats", timeout=5) as resp:
+            return json.loads(resp.read())
+    except Exception:
+        return None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Simulate concurrent students against one app instance.")
+    parser.add_argument("--users", default="1,2,4,8", help="Comma-separated user counts, one step each.")
+    parser.add_argument("--step-seconds", type=float, default=30.0)
+    parser.add_argument("--think-ms", type=float, default=2000.0, help="Mean think time between actions.")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Action weights, e.g. run=6,hint=2,explain=1,save=1,load=1.")
+    parser.add_argument("--repeat-code", type=float, default=0.2, help="Chance a run resubmits unchanged code (result cache hit).")
+    parser.add_argument("--provider", default="OpenAI", choices=["OpenAI", "Ollama", "None"])
+    parser.add_argument("--model", default="fake")
+    parser.add_argument("--llm-url", help="Base URL of a running fake (or real) server; default starts benchmarks/fake_llm.py.")
+    parser.add_argument("--ttft-ms", type=float, default=300.0)
+    parser.add_argument("--token-ms", type=float, default=20.0)
+    parser.add_argument("--tokens", type=int, default=60)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--min-gain", type=float, default=0.1, help="Throughput gain per step below which the instance counts as saturated.")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--run-p95-limit-ms", type=float, default=5000.0)
+    parser.add_argument("--data-dir", help="Where sessions and analytics are written (default: a temporary directory).")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="Write the JSON report here (default: stdout).")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    if args.provider == "None":
+        # Without a model hint/explain return at once and would only dilute the measured mix.
+        mix = {a: w for a, w in mix.items() if a not in ("hint", "explain")}
+        if not mix:
+            parser.error("--provider None leaves no actions in --mix")
+    user_steps = [int(u) for u in args.users.split(",") if u]
+    fake = None
+    llm_url = args.llm_url
+    if args.provider != "None" and not llm_url:
+        fake = start_fake_llm(args)
+        llm_url = fake.stdout.readline().strip()
+    if llm_url:
+        os.environ["OPENAI_BASE_URL"] = llm_url.rstrip("/") + "/v1"
+        os.environ["OLLAMA_BASE_URL"] = llm_url.rstrip("/")
+        os.environ.setdefault("OPENAI_API_KEY", "loadsim-fake-key")
+
+    data_dir = Path(args.data_dir or tempfile.mkdtemp(prefix="loadsim-"))
+    store = SessionStore(data_dir / "sessions.sqlite3")
+    analytics = AnalyticsStore(data_dir / "analytics.sqlite3")
+    # Fake answers must never reach the app's answer cache, which is not keyed by endpoint.
+    configure_result_cache(data_dir / "results.sqlite3")
+    configure_llm_cache(data_dir / "llm.sqlite3")
+    run_nonce = secrets.token_hex(4)
+    cfg = get_default_config()
+    tasks = get_tasks()
+    recorder = Recorder()
+    sampler = Sampler()
+    sampler.start()
+    steps = []
+    try:
+        for users in user_steps:
+            sampler.step_users = users
+            stop = threading.Event()
+            students = [SimStudent(uid, tasks, store, analytics, args, f"{run_nonce}-{users}-{uid}") for uid in range(users)]
+            threads = [
+                threading.Thread(target=s.loop, args=(stop, mix, cfg, recorder), name=f"loadsim-{s.name}", daemon=True)
+                for s in students
+            ]
+            print(f"step: {users} user(s) for {args.step_seconds:.0f}s", file=sys.stderr, flush=True)
+            started = time.perf_counter()
+            for t in threads:
+                t.start()
+            time.sleep(args.step_seconds)
+            stop.set()
+            for t in threads:
+                t.join()
+            # In-flight actions finish before the step ends, so count the time they took too.
+            step = summarize_step(users, time.perf_counter() - started, recorder.drain(), sampler.samples)
+            steps.append(step)
+            print(
+                f"  {step['throughput_per_s']:.2f} actions/s, {step['error_rate']:.1%} errors, "
+                f"run p95 {step['latency'].get('run', {}).get('p95_ms', 0):.0f} ms, "
+                f"{step['peak_processes']} processes, {step['peak_rss_mb']:.0f} MB",
+                file=sys.stderr,
+                flush=True,
+            )
+    finally:
+        sampler.stop()
+        llm_stats = fetch_stats(llm_url) if fake is not None else None
+        if fake is not None:
+            fake.terminate()
+            fake.wait()
+
+    report = {
+        "meta": {
+            "provider": args.provider,
+            "llm_url": llm_url,
+            "think_ms": args.think_ms,
+            "mix": mix,
+            "step_seconds": args.step_seconds,
+            "runner_pool_size": cfg.runner_pool_size,
+            "code_runner": cfg.code_runner,
+            "cpus": os.cpu_count(),
+            "data_dir": str(data_dir),
+        },
+        "steps": steps,
+        "saturation": find_saturation(steps, args.min_gain, args.max_error_rate, args.run_p95_limit_ms),
+        "fake_llm": llm_stats,
+        "timeline": sampler.samples,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    saturation = report["saturation"]
+    print(f"saturation: {saturation['users']} user(s); {saturation['reason']}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""Cold-start benchmark for app replicas: import time of app.py's own modules and time to first render.
+
+    python benchmarks/startup.py                  # exits 1 when a budget is exceeded
+    python benchmarks/startup.py --repeats 9 --import-budget-ms 300 --json
+
+Every sample runs in a fresh interpreter so nothing is warm. The import phase also fails when a
+module that must be loaded lazily (LLM providers, editor components) shows up at startup.
+First render uses streamlit.testing and is skipped when Streamlit is not installed.
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+APP = ROOT / "app.py"
+
+# Only imported on first use; loading any of them while importing the app is a regression.
+LAZY_MODULES = (
+    "langchain_openai",
+    "langchain_ollama",
+    "langchain_core",
+    "httpx",
+    "streamlit_monaco_editor",
+    "streamlit_monaco",
+    "streamlit_ace",
+)
+
+_IMPORT_PROBE = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+ms = (time.perf_counter() - started) * 1000
+print(json.dumps({{"ms": ms, "lazy_loaded": [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+_RENDER_PROBE = """
+import json, os, sys, time
+sys.path.insert(0, {root!r})
+os.chdir({root!r})
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({app!r}, default_timeout={timeout!r})
+app.run()
+ms = (time.perf_counter() - started) * 1000
+print(json.dumps({{"ms": ms, "errors": [str(e.value) for e in app.exception]}}))
+"""
+
+
+def app_modules() -> List[str]:
+    """The repo modules app.py imports at top level (third-party packages are not ours to budget)."""
+    tree = ast.parse(APP.read_text(encoding="utf-8"))
+    names = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names.extend(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.append(node.module.split(".")[0])
+    return [n for n in dict.fromkeys(names) if (ROOT / f"{n}.py").exists()]
+
+
+def _probe(source: str, timeout: float) -> Dict[str, Any]:
+    proc = subprocess.run(
+        [sys.executable, "-c", source], capture_output=True, text=True, timeout=timeout, cwd=str(ROOT)
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit status {proc.returncode}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def measure_imports(repeats: int) -> Dict[str, Any]:
+    modules = app_modules()
+    source = _IMPORT_PROBE.format(root=str(ROOT), modules=modules, lazy=LAZY_MODULES)
+    samples = [_probe(source, 120) for _ in range(repeats)]
+    return {
+        "modules": modules,
+        "median_ms": statistics.median(s["ms"] for s in samples),
+        "max_ms": max(s["ms"] for s in samples),
+        "lazy_loaded": sorted({m for s in samples for m in s["lazy_loaded"]}),
+    }
+
+
+def measure_first_render(repeats: int, timeout: float) -> Dict[str, Any]:
+    try:
+        import streamlit.testing.v1  # noqa: F401
+    except Exception:
+        return {"skipped": "streamlit.testing is not available"}
+    source = _RENDER_PROBE.format(root=str(ROOT), app=str(APP), timeout=timeout)
+    samples = [_probe(source, timeout + 60) for _ in range(repeats)]
+    return {
+        "median_ms": statistics.median(s["ms"] for s in samples),
+        "max_ms": max(s["ms"] for s in samples),
+        "errors": sorted({e for s in samples for e in s["errors"]}),
+    }
+
+
+def check(report: Dict[str, Any], import_budget_ms: float, render_budget_ms: float) -> List[str]:
+    """Budget violations in report, as messages; empty when everything is within budget."""
+    problems = []
+    imports = report["imports"]
+    if imports["median_ms"] > import_budget_ms:
+        problems.append(f"import time {imports['median_ms']:.0f} ms exceeds budget of {import_budget_ms:.0f} ms")
+    if imports["lazy_loaded"]:
+        problems.append(f"imported at startup but should be lazy: {', '.join(imports['lazy_loaded'])}")
+    render = report["first_render"]
+    if "skipped" not in render:
+        if render["errors"]:
+            problems.append(f"first render raised: {render['errors'][0]}")
+        if render["median_ms"] > render_budget_ms:
+            problems.append(f"first render {render['median_ms']:.0f} ms exceeds budget of {render_budget_ms:.0f} ms")
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure cold import and first-render time of the app against a budget.")
+    parser.add_argument("--repeats", type=int, default=5, help="Fresh interpreters per measurement (the median is compared).")
+    parser.add_argument("--import-budget-ms", type=float, default=float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "500")))
+    parser.add_argument("--render-budget-ms", type=float, default=float(os.getenv("STARTUP_RENDER_BUDGET_MS", "4000")))
+    parser.add_argument("--render-timeout", type=float, default=30.0)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = parser.parse_args()
+
+    report = {
+        "imports": measure_imports(args.repeats),
+        "first_render": measure_first_render(max(1, args.repeats // 2), args.render_timeout),
+        "budget_ms": {"imports": args.import_budget_ms, "first_render": args.render_budget_ms},
+    }
+    problems = check(report, args.import_budget_ms, args.render_budget_ms)
+    report["ok"] = not problems
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        imports, render = report["imports"], report["first_render"]
+        print(f"imports:      median {imports['median_ms']:.1f} ms, max {imports['max_ms']:.1f} ms (budget {args.import_budget_ms:.0f} ms)")
+        if "skipped" in render:
+            print(f"first render: skipped, {render['skipped']}")
+        else:
+            print(f"first render: median {render['median_ms']:.1f} ms, max {render['max_ms']:.1f} ms (budget {args.render_budget_ms:.0f} ms)")
+        for problem in problems:
+            print(f"FAIL: {problem}")
+    return 0 if not problems else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
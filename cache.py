@@ -0,0 +1,270 @@
+import ast
+import dataclasses
+import hashlib
+import json
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config import get_default_config
+from tasks import Task
+
+CACHE_DIR = Path(__file__).resolve().parent / ".cache"
+
+
+def _sha256(*parts: str) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def normalize_code(code: str) -> str:
+    """Canonical form of code: its AST dump, so whitespace and comments do not matter."""
+    try:
+        return ast.dump(ast.parse(code))
+    except SyntaxError:
+        return code
+
+
+_SCALAR_TYPES = {int, float, complex, bool, str, bytes, type(None)}
+
+
+def _canonical(value: Any) -> Any:
+    """value with every set in a sorted order, so its pickle does not depend on hash randomization."""
+    if isinstance(value, (set, frozenset)):
+        return (type(value).__name__, sorted((_canonical(v) for v in value), key=repr))
+    if type(value) in (list, tuple):
+        # Large flat sequences are the common case; they have nothing to reorder.
+        if all(type(v) in _SCALAR_TYPES for v in value):
+            return value
+        return type(value)(_canonical(v) for v in value)
+    if isinstance(value, dict):
+        return {_canonical(k): _canonical(v) for k, v in value.items()}
+    return value
+
+
+def tests_fingerprint(task: Task) -> str:
+    """Stable hash of everything in a task that affects grading (function name, test cases, perf spec).
+
+    Hashes the pickled values, so types JSON would merge (tuple and list, str and bytes) differ.
+    Computed once per Task object and kept on it: a Task's tests must not change afterwards.
+    """
+    if task.fingerprint is None:
+        payload = [
+            task.function_name,
+            [[tc.description, tc.input_args, tc.input_kwargs, tc.expected_output] for tc in task.tests],
+            dataclasses.asdict(task.perf) if task.perf else None,
+        ]
+        task.fingerprint = hashlib.sha256(pickle.dumps(_canonical(payload), protocol=4)).hexdigest()
+    return task.fingerprint
+
+
+class LRUCache:
+    def __init__(self, max_items: int = 512, ttl_seconds: Optional[float] = None):
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, stored = item
+            if self.ttl_seconds is not None and time.time() - stored > self.ttl_seconds:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (value, time.time())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DiskCache:
+    """SQLite-backed key/value store evicting least recently used entries past max_bytes.
+
+    With ttl_seconds set, entries older than the TTL are treated as missing and purged.
+    """
+
+    def __init__(self, path: Path, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: Optional[float] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL, created REAL NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(entries)")}
+        if "created" not in columns:
+            self._conn.execute("ALTER TABLE entries ADD COLUMN created REAL NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def put(self, key: str, value: bytes) -> None:
+        with self._lock:
+            now = time.time()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, accessed, created) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now, now),
+            )
+            if self.ttl_seconds is not None:
+                self._conn.execute("DELETE FROM entries WHERE created < ?", (now - self.ttl_seconds,))
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                self._evict(total - self.max_bytes)
+
+    def _evict(self, excess: int) -> None:
+        freed = 0
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY accessed"):
+            doomed.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution of fn."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Return (value, shared); shared is True when another caller's in-flight result was reused."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value, False
+
+
+class ResultCache:
+    """Two-tier (memory LRU over SQLite) cache for evaluation results, with hit/miss counters."""
+
+    def __init__(self, disk_path: Path, max_memory_items: int = 512, max_disk_bytes: int = 64 * 1024 * 1024):
+        self.memory = LRUCache(max_memory_items)
+        self.disk = DiskCache(disk_path, max_disk_bytes)
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.hits += 1
+            self.memory_hits += 1
+            return value
+        blob = self.disk.get(key)
+        if blob is None:
+            self.misses += 1
+            return None
+        value = json.loads(blob)
+        self.memory.put(key, value)
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        self.memory.put(key, value)
+        self.disk.put(key, json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.hits - self.memory_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory),
+        }
+
+
+def result_key(user_code: str, task: Task, timeout_seconds: float, harness_version: str) -> str:
+    return _sha256(harness_version, normalize_code(user_code), tests_fingerprint(task), str(float(timeout_seconds)))
+
+
+_RESULT_CACHE: Optional[ResultCache] = None
+_RESULT_CACHE_PATH: Optional[Path] = CACHE_DIR / "results.sqlite3"
+_RESULT_CACHE_LOCK = threading.Lock()
+
+
+def configure_result_cache(path: Optional[Path]) -> None:
+    """Keep this process's result cache at path instead of .cache/ (None disables it), e.g. for load tests."""
+    global _RESULT_CACHE, _RESULT_CACHE_PATH
+    with _RESULT_CACHE_LOCK:
+        _RESULT_CACHE, _RESULT_CACHE_PATH = None, path
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    global _RESULT_CACHE
+    cfg = get_default_config()
+    if not cfg.result_cache_enabled:
+        return None
+    with _RESULT_CACHE_LOCK:
+        if _RESULT_CACHE_PATH is None:
+            return None
+        if _RESULT_CACHE is None:
+            _RESULT_CACHE = ResultCache(
+                _RESULT_CACHE_PATH,
+                max_memory_items=cfg.result_cache_memory_items,
+                max_disk_bytes=cfg.result_cache_max_mb * 1024 * 1024,
+            )
+        return _RESULT_CACHE
@@ -0,0 +1,70 @@
+import subprocess
+from collections import deque
+from typing import Deque
+
+
+class OutputLimitExceeded(subprocess.SubprocessError):
+    """The child printed more than limit bytes and was killed; output/stderr hold what was kept."""
+
+    def __init__(self, limit: int, output: str = "", stderr: str = "", dropped: int = 0):
+        super().__init__(f"output limit of {limit} bytes exceeded")
+        self.limit = limit
+        self.output = output
+        self.stderr = stderr
+        self.dropped = dropped
+
+
+class RunCancelled(subprocess.SubprocessError):
+    """The run was cancelled by its caller and the child killed; output/stderr hold what was kept."""
+
+    def __init__(self, output: str = "", stderr: str = ""):
+        super().__init__("run cancelled")
+        self.output = output
+        self.stderr = stderr
+
+
+class HeadTailBuffer:
+    """Text buffer keeping the first and last max_chars // 2 characters and counting the rest."""
+
+    def __init__(self, max_chars: int):
+        self.head_limit = max_chars // 2
+        self.tail_limit = max_chars - self.head_limit
+        self.total = 0
+        self._head: list = []
+        self._head_len = 0
+        self._tail: Deque[str] = deque()
+        self._tail_len = 0
+
+    def write(self, text: str) -> None:
+        if not text:
+            return
+        self.total += len(text)
+        if self._head_len < self.head_limit:
+            part = text[: self.head_limit - self._head_len]
+            self._head.append(part)
+            self._head_len += len(part)
+            text = text[len(part):]
+            if not text:
+                return
+        self._tail.append(text)
+        self._tail_len += len(text)
+        while self._tail_len > self.tail_limit:
+            excess = self._tail_len - self.tail_limit
+            first = self._tail[0]
+            if len(first) <= excess:
+                self._tail.popleft()
+                self._tail_len -= len(first)
+            else:
+                self._tail[0] = first[excess:]
+                self._tail_len -= excess
+
+    @property
+    def dropped(self) -> int:
+        return self.total - self._head_len - self._tail_len
+
+    def getvalue(self) -> str:
+        head = "".join(self._head)
+        tail = "".join(self._tail)
+        if not self.dropped:
+            return head + tail
+        return f"{head}\n... [{self.dropped} characters omitted] ...\n{tail}"
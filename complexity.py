@@ -0,0 +1,79 @@
+import math
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Ordered from fastest to slowest growth.
+COMPLEXITY_CLASSES: List[Tuple[str, Callable[[float], float]]] = [
+    ("O(1)", lambda n: 1.0),
+    ("O(log n)", lambda n: math.log(n)),
+    ("O(n)", lambda n: n),
+    ("O(n log n)", lambda n: n * math.log(n)),
+    ("O(n²)", lambda n: n ** 2),
+    ("O(n³)", lambda n: n ** 3),
+]
+
+# Polynomial degree of each class. Timings cannot reliably tell a log factor apart,
+# so classes of the same degree are treated as equivalent when grading.
+_DEGREE = {"O(1)": 0, "O(log n)": 0, "O(n)": 1, "O(n log n)": 1, "O(n²)": 2, "O(n³)": 3}
+
+_ALIASES = {"^2": "²", "^3": "³", "**2": "²", "**3": "³"}
+
+# A slower class is only preferred when it fits clearly better than a faster one.
+_PREFER_SIMPLER_TOLERANCE = 1.25
+
+
+def normalize_label(label: str) -> str:
+    label = label.strip().replace(" ", "")
+    for old, new in _ALIASES.items():
+        label = label.replace(old, new)
+    for name, _ in COMPLEXITY_CLASSES:
+        if name.replace(" ", "") == label:
+            return name
+    raise ValueError(f"Unknown complexity class: {label}")
+
+
+def _fit_error(xs: Sequence[float], ys: Sequence[float]) -> float:
+    """Relative squared error of the least-squares fit y = a*x + b with a >= 0."""
+    mx = sum(xs) / len(xs)
+    my = sum(ys) / len(ys)
+    var = sum((x - mx) ** 2 for x in xs)
+    a = sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / var if var > 0 else 0.0
+    if a < 0:
+        a = 0.0
+    b = my - a * mx
+    return sum(((y - (a * x + b)) / y) ** 2 for x, y in zip(xs, ys) if y > 0)
+
+
+def fit_complexity(points: Sequence[Tuple[int, float]]) -> Optional[Dict[str, float]]:
+    """Return {class label: fit error} for measured (n, seconds) points, or None if too few."""
+    points = [(n, t) for n, t in points if n > 1 and t > 0]
+    if len(points) < 3:
+        return None
+    ns = [float(n) for n, _ in points]
+    ts = [t for _, t in points]
+    return {name: _fit_error([f(n) for n in ns], ts) for name, f in COMPLEXITY_CLASSES}
+
+
+def best_fit(errors: Dict[str, float]) -> str:
+    best = min(errors.values())
+    for name, _ in COMPLEXITY_CLASSES:
+        if errors[name] <= best * _PREFER_SIMPLER_TOLERANCE + 1e-9:
+            return name
+    return min(errors, key=errors.get)
+
+
+def grade_complexity(points: Sequence[Tuple[int, float]], expected: str) -> Dict[str, object]:
+    expected = normalize_label(expected)
+    errors = fit_complexity(points)
+    if errors is None:
+        return {
+            "expected": expected,
+            "fitted": None,
+            "ok": None,
+            "message": f"Not enough measurements to estimate complexity (expected {expected})",
+        }
+    fitted = best_fit(errors)
+    if _DEGREE[fitted] == _DEGREE[expected]:
+        fitted = expected
+    ok = _DEGREE[fitted] <= _DEGREE[expected]
+    message = f"Looks {fitted}, expected {expected}" + ("" if ok else " — try a more efficient approach")
+    return {"expected": expected, "fitted": fitted, "ok": ok, "message": message}
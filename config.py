@@ -9,11 +9,43 @@ class Config:
     openai_model: str = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
     ollama_model: str = os.getenv("OLLAMA_MODEL", "llama3:8b-instruct")
     ai_temperature: float = float(os.getenv("AI_TEMPERATURE", "0.3"))
+    llm_timeout_seconds: float = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+    llm_max_retries: int = int(os.getenv("LLM_MAX_RETRIES", "2"))
+    llm_retry_backoff_seconds: float = float(os.getenv("LLM_RETRY_BACKOFF_SECONDS", "0.5"))
+    llm_prompt_token_budget: int = int(os.getenv("LLM_PROMPT_TOKEN_BUDGET", "1500"))
 
     execution_timeout_seconds: int = int(os.getenv("EXECUTION_TIMEOUT_SECONDS", "3"))
-    max_output_chars: int = 8000
+    max_output_chars: int = 8000  # kept (head + tail) of a run's stdout/stderr for display
+    max_output_bytes: int = int(os.getenv("MAX_OUTPUT_BYTES", str(16 * 1024 * 1024)))  # child is killed past this
 
     code_runner: str = os.getenv("CODE_RUNNER", "local")  # local | interpreter_api
+    interpreter_api_url: str = os.getenv("INTERPRETER_API_URL", "http://127.0.0.1:8765")  # or unix:///path/to.sock
+    runner_pool_size: int = int(os.getenv("RUNNER_POOL_SIZE", str(os.cpu_count() or 2)))  # 0 disables the warm pool
+    runner_pool_wait_seconds: float = float(os.getenv("RUNNER_POOL_WAIT_SECONDS", "0.1"))  # then cold-start instead
+    runner_pool_max_jobs: int = int(os.getenv("RUNNER_POOL_MAX_JOBS", "50"))
+    fail_fast: bool = os.getenv("FAIL_FAST", "0") == "1"  # stop a run at the first failing test
+    test_shards: int = int(os.getenv("TEST_SHARDS", "1"))  # run a task's cases as this many concurrent harnesses
+    live_mode: bool = os.getenv("LIVE_MODE", "0") == "1"  # re-run tests in the background as the code is edited
+    live_debounce_ms: int = int(os.getenv("LIVE_DEBOUNCE_MS", "800"))  # quiet period before a live run starts
+
+    run_cpu_limit_seconds: int = int(os.getenv("RUN_CPU_LIMIT_SECONDS", "0"))  # 0: execution timeout + 1s
+    run_memory_limit_mb: int = int(os.getenv("RUN_MEMORY_LIMIT_MB", "1024"))  # address space; 0 disables
+    run_max_open_files: int = int(os.getenv("RUN_MAX_OPEN_FILES", "64"))
+    run_max_processes: int = int(os.getenv("RUN_MAX_PROCESSES", "256"))  # per user (RLIMIT_NPROC); 0 disables
+    run_cgroup_dir: str = os.getenv("RUN_CGROUP_DIR", "")  # delegated cgroup v2 dir for per-run groups
+
+    result_cache_enabled: bool = os.getenv("RESULT_CACHE", "1") == "1"
+    result_cache_memory_items: int = int(os.getenv("RESULT_CACHE_MEMORY_ITEMS", "512"))
+    result_cache_max_mb: int = int(os.getenv("RESULT_CACHE_MAX_MB", "64"))
+
+    metrics_enabled: bool = os.getenv("METRICS", "1") == "1"  # timing spans into in-process histograms
+    metrics_port: int = int(os.getenv("METRICS_PORT", "0"))  # serve /metrics (Prometheus text) here; 0 disables
+    trace_log: str = os.getenv("TRACE_LOG", "")  # append every finished span as a JSON line to this file
+
+    llm_cache_enabled: bool = os.getenv("LLM_CACHE", "1") == "1"
+    llm_cache_ttl_seconds: int = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(24 * 3600)))
+    llm_cache_memory_items: int = int(os.getenv("LLM_CACHE_MEMORY_ITEMS", "256"))
+    llm_cache_max_mb: int = int(os.getenv("LLM_CACHE_MAX_MB", "32"))
 
     def to_dict(self) -> Dict[str, Any]:
         return asdict(self)
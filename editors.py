@@ -0,0 +1,30 @@
+import importlib
+import threading
+from typing import Any, Callable, Optional, Tuple
+
+# Editor components in order of preference: (kind, module, attribute).
+EDITOR_CANDIDATES = (
+    ("monaco_editor", "streamlit_monaco_editor", "st_monaco_editor"),
+    ("monaco", "streamlit_monaco", "st_monaco"),
+    ("ace", "streamlit_ace", "st_ace"),
+)
+
+# Resolved once per process. app.py is re-executed by Streamlit on every rerun, so the lookup
+# lives here (an imported module) rather than in the script; a missing package is not searched for again.
+_EDITOR: Optional[Tuple[str, Optional[Callable[..., Any]]]] = None
+_EDITOR_LOCK = threading.Lock()
+
+
+def get_editor() -> Tuple[str, Optional[Callable[..., Any]]]:
+    """(kind, component) of the first importable editor package, or ("textarea", None)."""
+    global _EDITOR
+    with _EDITOR_LOCK:
+        if _EDITOR is None:
+            _EDITOR = ("textarea", None)
+            for kind, module, attr in EDITOR_CANDIDATES:
+                try:
+                    _EDITOR = (kind, getattr(importlib.import_module(module), attr))
+                    break
+                except Exception:
+                    continue
+        return _EDITOR
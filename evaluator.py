@@ -1,73 +1,438 @@
 import json
-from typing import Any, Dict
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from textwrap import dedent
+from capture import HeadTailBuffer
+from config import get_default_config
 from tasks import Task
 from runner import run_harness
+from cache import get_result_cache, result_key
+from fixtures import LOADER_SOURCE, fixture_path
+from complexity import grade_complexity
+from metrics import span
 
+# Bump when the harness or result format changes so cached results are not reused.
+HARNESS_VERSION = "9"
+
+# Prefix of the harness's own stdout lines; anything else on stdout was printed by the user code.
+EVENT_MARKER = "\x1e@ct-event "
+
+# The complexity phase is skipped when less than this much of the overall timeout is left.
+MIN_PERF_BUDGET_SECONDS = 0.25
+
+
+def _append_emitter(parts: List[str]) -> None:
+    parts.append(f"\n_MARKER = {EVENT_MARKER!r}\n\n")
+    parts.append("def _emit(event):\n")
+    parts.append("    # Leading newline keeps the marker at line start even after a user print(..., end='').\n")
+    parts.append("    sys.stdout.write('\\n' + _MARKER + json.dumps(event, ensure_ascii=False, default=repr) + '\\n')\n")
+    parts.append("    sys.stdout.flush()\n\n")
+
+
+def _build_harness(user_code: str, task: Task, fail_fast: bool = False, indices: Optional[List[int]] = None) -> str:
+    """Harness running the task's cases (only those at indices, if given) and emitting result events."""
+    with span("build_harness", task=task.id):
+        # Test cases travel out-of-band as a cached pickle file instead of a literal in the source.
+        cases_path = fixture_path(task)
+
+        parts = []
+        # Nothing but comments may precede the user code: it can start with a __future__ import.
+        parts.append("# --- user solution ---\n")
+        parts.append(user_code)
+        parts.append("\n\n# --- test harness ---\n")
+        parts.append("import json, sys, time, traceback\n")
+        parts.append(LOADER_SOURCE)
+        _append_emitter(parts)
+        # Peak memory comes from the process RSS high-water mark, not tracemalloc, which slows
+        # allocation-heavy code several times over and skews the timings. On Linux the mark is
+        # reset before each case; elsewhere only growth above the previous peak is seen.
+        parts.append("def _status_kb(field):\n")
+        parts.append("    with open('/proc/self/status') as f:\n")
+        parts.append("        for line in f:\n")
+        parts.append("            if line.startswith(field):\n")
+        parts.append("                return float(line.split()[1])\n")
+        parts.append("    return 0.0\n\n")
+        parts.append("try:\n")
+        parts.append("    _CLEAR_REFS = open('/proc/self/clear_refs', 'w')\n")
+        parts.append("    def _mem_mark():\n")
+        parts.append("        _CLEAR_REFS.write('5')\n")
+        parts.append("        _CLEAR_REFS.flush()\n")
+        parts.append("        return _status_kb('VmRSS:')\n")
+        parts.append("    def _mem_peak():\n")
+        parts.append("        return _status_kb('VmHWM:')\n")
+        parts.append("except OSError:\n")
+        parts.append("    try:\n")
+        parts.append("        import resource\n")
+        parts.append("        _RSS_SCALE = 1024 if sys.platform == 'darwin' else 1\n")
+        parts.append("        def _mem_peak():\n")
+        parts.append("            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / _RSS_SCALE\n")
+        parts.append("    except ImportError:\n")
+        parts.append("        def _mem_peak():\n")
+        parts.append("            return 0.0\n")
+        parts.append("    _mem_mark = _mem_peak\n\n")
+        parts.append("def _run_one(func, case):\n")
+        parts.append("    mem0 = _mem_mark()\n")
+        parts.append("    wall0, cpu0 = time.perf_counter(), time.process_time()\n")
+        parts.append("    try:\n")
+        parts.append("        out = func(*case[\"args\"], **case[\"kwargs\"])\n")
+        parts.append("        ok, err = out == case[\"expected\"], None\n")
+        parts.append("    except MemoryError:\n")
+        parts.append("        ok, err, out = False, 'MemoryError: memory limit exceeded', None\n")
+        parts.append("    except Exception as e:\n")
+        parts.append("        ok, err, out = False, type(e).__name__ + ': ' + str(e), None\n")
+        parts.append("    stats = {\n")
+        parts.append("        \"wall_ms\": (time.perf_counter() - wall0) * 1000,\n")
+        parts.append("        \"cpu_ms\": (time.process_time() - cpu0) * 1000,\n")
+        parts.append("        \"peak_kb\": max(_mem_peak() - mem0, 0.0),\n")
+        parts.append("    }\n")
+        parts.append("    return ok, err, out, stats\n\n")
+        parts.append("def main():\n")
+        # Taken once the submission's module body has run, so startup includes its imports.
+        parts.append("    t0 = time.time()\n")
+        parts.append(f"    cases = _load_cases({cases_path.name!r}, {str(cases_path.parent)!r})\n")
+        parts.append(f"    from __main__ import {task.function_name} as target\n")
+        parts.append("    pass_count = 0\n")
+        parts.append("    _emit({\"event\": \"start\", \"total\": len(cases), \"t0\": t0})\n")
+        if indices is None:
+            parts.append("    for index, case in enumerate(cases):\n")
+        else:
+            parts.append(f"    for index in {list(indices)!r}:\n")
+            parts.append("        case = cases[index]\n")
+        parts.append("        _emit({\"event\": \"begin\", \"index\": index})\n")
+        parts.append("        ok, err, out, stats = _run_one(target, case)\n")
+        parts.append("        if ok:\n")
+        parts.append("            pass_count += 1\n")
+        parts.append("        _emit({\n")
+        parts.append("            \"event\": \"case\",\n")
+        parts.append("            \"index\": index,\n")
+        parts.append("            \"description\": case[\"description\"],\n")
+        parts.append("            \"ok\": ok,\n")
+        parts.append("            \"expected\": case[\"expected\"],\n")
+        parts.append("            \"output\": out,\n")
+        parts.append("            \"error\": err,\n")
+        parts.append("            **stats,\n")
+        parts.append("        })\n")
+        if fail_fast:
+            parts.append("        if not ok:\n")
+            parts.append("            break\n")
+        parts.append("    _emit({\"event\": \"end\", \"pass_count\": pass_count, \"total\": len(cases)})\n\n")
+        parts.append("if __name__ == \"__main__\":\n")
+        parts.append("    main()\n")
+
+        return "".join(parts)
 
-def _build_harness(user_code: str, task: Task) -> str:
-    tests_json = json.dumps([
-        {
-            "description": tc.description,
-            "args": tc.input_args,
-            "kwargs": tc.input_kwargs,
-            "expected": tc.expected_output,
-        }
-        for tc in task.tests
-    ], ensure_ascii=False)
 
+def _build_perf_harness(user_code: str, task: Task, budget_seconds: float) -> str:
+    spec = task.perf
     parts = []
     parts.append("# --- user solution ---\n")
     parts.append(user_code)
-    parts.append("\n\n# --- test harness ---\n")
-    parts.append("import json, time, traceback\n\n")
-    parts.append("RESULT = {\"pass_count\": 0, \"total\": 0, \"details\": []}\n\n")
-    parts.append("def _run_one(func, case):\n")
-    parts.append("    try:\n")
-    parts.append("        out = func(*case[\"args\"], **case[\"kwargs\"])\n")
-    parts.append("        ok = out == case[\"expected\"]\n")
-    parts.append("        return ok, None, out\n")
-    parts.append("    except Exception as e:\n")
-    parts.append("        err_msg = type(e).__name__ + ': ' + str(e)\n")
-    parts.append("        return False, err_msg, None\n\n")
+    parts.append("\n\n# --- input generator ---\n")
+    parts.append(dedent(spec.input_generator))
+    parts.append("\n\n# --- performance harness ---\n")
+    parts.append("import json, sys, time\n")
+    _append_emitter(parts)
+    parts.append("def _sample(func, args, number):\n")
+    parts.append("    t0 = time.perf_counter()\n")
+    parts.append("    for _ in range(number):\n")
+    parts.append("        func(*args)\n")
+    parts.append("    return (time.perf_counter() - t0) / number\n\n")
     parts.append("def main():\n")
-    parts.append(f"    cases = json.loads(r'''{tests_json}''')\n")
     parts.append(f"    from __main__ import {task.function_name} as target\n")
-    parts.append("    RESULT[\"total\"] = len(cases)\n")
-    parts.append("    for case in cases:\n")
-    parts.append("        ok, err, out = _run_one(target, case)\n")
-    parts.append("        if ok:\n")
-    parts.append("            RESULT[\"pass_count\"] += 1\n")
-    parts.append("        RESULT[\"details\"].append({\n")
-    parts.append("            \"description\": case[\"description\"],\n")
-    parts.append("            \"ok\": ok,\n")
-    parts.append("            \"expected\": case[\"expected\"],\n")
-    parts.append("            \"output\": out,\n")
-    parts.append("            \"error\": err,\n")
-    parts.append("        })\n")
-    parts.append("    print(json.dumps(RESULT, ensure_ascii=False))\n\n")
+    parts.append(f"    deadline = time.perf_counter() + {float(budget_seconds)!r}\n")
+    parts.append(f"    for n in {list(spec.sizes)!r}:\n")
+    parts.append("        args = make_input(n)\n")
+    parts.append(f"        for _ in range({int(spec.warmup)}):\n")
+    parts.append("            target(*args)\n")
+    parts.append("        # Batch fast calls so one sample spans well above timer resolution.\n")
+    parts.append("        number = 1\n")
+    parts.append("        while number < 1000 and _sample(target, args, number) * number < 0.002:\n")
+    parts.append("            number *= 10\n")
+    parts.append(f"        best = min(_sample(target, args, number) for _ in range({max(int(spec.repeats), 1)}))\n")
+    parts.append("        _emit({\"event\": \"perf\", \"n\": n, \"seconds\": best})\n")
+    parts.append("        if time.perf_counter() >= deadline:\n")
+    parts.append("            break\n\n")
     parts.append("if __name__ == \"__main__\":\n")
     parts.append("    main()\n")
 
     return "".join(parts)
 
 
-def evaluate_solution(user_code: str, task: Task, timeout_seconds: int = 3) -> Dict[str, Any]:
-    harness = _build_harness(user_code, task)
-    ok, out, err = run_harness(harness, timeout_seconds=timeout_seconds)
-    if not ok:
-        return {
-            "success": False,
-            "error": err or "Execution failed",
-            "raw": out,
-        }
-    try:
-        data = json.loads(out.strip())
-        data["success"] = True
-        return data
-    except json.JSONDecodeError:
-        return {
-            "success": False,
-            "error": "Invalid harness output",
-            "raw": out,
+class _EventParser:
+    """Incrementally splits harness stdout into result events and plain user output."""
+
+    def __init__(self, on_result: Optional[Callable[[Dict[str, Any]], None]] = None, max_output_chars: int = 8000):
+        self.on_result = on_result
+        self.max_output_chars = max_output_chars
+        self.total: Optional[int] = None
+        self.details: List[Dict[str, Any]] = []
+        self.pass_count = 0
+        self.running: Optional[int] = None
+        self.started_at: Optional[float] = None
+        self.perf_points: List[List[float]] = []
+        self.finished = False
+        # Plain prints are kept head + tail only; events are parsed from the stream as it passes.
+        self.user_output = HeadTailBuffer(max_output_chars)
+        self._partial = ""
+        self._blank_pending = False
+
+    def feed(self, chunk: str) -> None:
+        lines = (self._partial + chunk).split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self._handle_line(line)
+        # Markers only ever start a line, so a long unterminated line without one is plain output.
+        if len(self._partial) > self.max_output_chars and not self._partial.startswith(EVENT_MARKER):
+            if self._blank_pending:
+                self.user_output.write("\n")
+                self._blank_pending = False
+            self.user_output.write(self._partial)
+            self._partial = ""
+
+    def close(self) -> None:
+        if self._partial:
+            self._handle_line(self._partial)
+            self._partial = ""
+        if self._blank_pending:
+            self.user_output.write("\n")
+            self._blank_pending = False
+
+    def _handle_line(self, line: str) -> None:
+        pos = line.find(EVENT_MARKER)
+        if pos != 0 and self._blank_pending:
+            self.user_output.write("\n")
+        # An empty line right before an event is the newline _emit itself wrote.
+        self._blank_pending = pos < 0 and not line
+        if self._blank_pending:
+            return
+        if pos < 0:
+            self.user_output.write(line + "\n")
+            return
+        if pos > 0:
+            self.user_output.write(line[:pos] + "\n")
+        try:
+            event = json.loads(line[pos + len(EVENT_MARKER):])
+        except json.JSONDecodeError:
+            return
+        kind = event.pop("event", None)
+        if kind == "start":
+            self.total = event["total"]
+            self.started_at = event.get("t0")
+        elif kind == "begin":
+            self.running = event["index"]
+        elif kind == "case":
+            self.running = None
+            if event.get("ok"):
+                self.pass_count += 1
+            self.details.append(event)
+            if self.on_result is not None:
+                self.on_result(event)
+        elif kind == "perf":
+            self.perf_points.append([event["n"], event["seconds"]])
+        elif kind == "end":
+            self.finished = True
+
+
+def evaluate_solution(
+    user_code: str,
+    task: Task,
+    timeout_seconds: int = 3,
+    code_runner: str = "local",
+    use_cache: bool = True,
+    on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+    fail_fast: bool = False,
+    cancel: Optional[threading.Event] = None,
+) -> Dict[str, Any]:
+    """Grade user_code against task. on_result, if given, receives each test case detail as it finishes.
+
+    With fail_fast the run stops at the first failing case and the result has stopped_early set.
+    Setting cancel kills the run; the result then has cancelled set and is not cached.
+    """
+    with span("evaluate_solution", task=task.id) as labels:
+        res = _evaluate_cached(user_code, task, timeout_seconds, code_runner, use_cache, on_result, fail_fast, cancel)
+        labels["outcome"] = outcome_of(res)
+        labels["cached"] = "true" if res.get("cached") else "false"
+        return res
+
+
+def outcome_of(res: Dict[str, Any]) -> str:
+    """pass, fail, timeout, cancelled or error: a coarse label for an evaluation result."""
+    if res.get("cancelled"):
+        return "cancelled"
+    if res.get("success"):
+        return "pass" if res.get("pass_count") == res.get("total") else "fail"
+    if str(res.get("error", "")).startswith("Timeout"):
+        return "timeout"
+    return "error"
+
+
+def _evaluate_cached(
+    user_code: str,
+    task: Task,
+    timeout_seconds: int,
+    code_runner: str,
+    use_cache: bool,
+    on_result: Optional[Callable[[Dict[str, Any]], None]],
+    fail_fast: bool,
+    cancel: Optional[threading.Event],
+) -> Dict[str, Any]:
+    cache = get_result_cache() if use_cache else None
+    if cache is None:
+        return _evaluate(user_code, task, timeout_seconds, code_runner, on_result, fail_fast, cancel)
+    key = result_key(user_code, task, timeout_seconds, HARNESS_VERSION + ("-ff" if fail_fast else ""))
+    hit = cache.get(key)
+    if hit is not None:
+        return dict(hit, cached=True)
+    res = _evaluate(user_code, task, timeout_seconds, code_runner, on_result, fail_fast, cancel)
+    # Only successful runs are cached; failures may be transient (timeouts, busy service).
+    if res.get("success"):
+        cache.put(key, res)
+    return res
+
+
+def _shard_indices(count: int, shards: int) -> List[Optional[List[int]]]:
+    """Split case indices round-robin, so neighbouring (often similarly heavy) cases land on different shards."""
+    shards = min(shards, count)
+    if shards <= 1:
+        return [None]
+    return [list(range(i, count, shards)) for i in range(shards)]
+
+
+def _run_shards(
+    user_code: str,
+    task: Task,
+    shards: List[Optional[List[int]]],
+    timeout_seconds: int,
+    code_runner: str,
+    on_result: Optional[Callable[[Dict[str, Any]], None]],
+    fail_fast: bool,
+    cancel: Optional[threading.Event] = None,
+) -> List[Tuple[bool, str, _EventParser]]:
+    """Run each shard's harness concurrently, each with the full timeout; returns (ok, err, parser) per shard."""
+    max_chars = get_default_config().max_output_chars
+    # A remote runner gets the fixture file with the request unless it already has it.
+    fixtures = [fixture_path(task)]
+    if len(shards) == 1:
+        parser = _EventParser(on_result, max_chars)
+        harness = _build_harness(user_code, task, fail_fast, shards[0])
+        ok, _, err = run_harness(harness, timeout_seconds, code_runner, parser.feed, cancel, fixtures)
+        parser.close()
+        return [(ok, err, parser)]
+
+    # Shard threads only queue their results; on_result is called from this thread (it may touch UI state).
+    events: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+    parsers = [_EventParser(events.put if on_result else None, max_chars) for _ in shards]
+
+    def run(i: int) -> Tuple[bool, str]:
+        harness = _build_harness(user_code, task, fail_fast, shards[i])
+        ok, _, err = run_harness(harness, timeout_seconds, code_runner, parsers[i].feed, cancel, fixtures)
+        parsers[i].close()
+        return ok, err
+
+    with ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix="ct-shard") as executor:
+        futures = [executor.submit(run, i) for i in range(len(shards))]
+        while True:
+            finished = all(f.done() for f in futures)
+            try:
+                while True:
+                    on_result(events.get(timeout=0.05) if not finished else events.get_nowait())
+            except queue.Empty:
+                pass
+            if finished:
+                break
+    return [(*f.result(), parser) for f, parser in zip(futures, parsers)]
+
+
+def _evaluate(
+    user_code: str,
+    task: Task,
+    timeout_seconds: int,
+    code_runner: str,
+    on_result: Optional[Callable[[Dict[str, Any]], None]],
+    fail_fast: bool = False,
+    cancel: Optional[threading.Event] = None,
+) -> Dict[str, Any]:
+    shards = _shard_indices(len(task.tests), get_default_config().test_shards)
+    launched = time.time()
+    runs = _run_shards(user_code, task, shards, timeout_seconds, code_runner, on_result, fail_fast, cancel)
+    timing = {"total_ms": (time.time() - launched) * 1000}
+    parsers = [parser for _, _, parser in runs]
+    started = [p.started_at for p in parsers if p.started_at is not None]
+    if started:
+        # Time from launch until the harness began running tests: interpreter start or fork, plus the
+        # module-level code of the submission.
+        timing["startup_ms"] = max(min(started) - launched, 0.0) * 1000
+    if len(shards) > 1:
+        timing["shards"] = len(shards)
+    raw = "".join(p.user_output.getvalue() for p in parsers).strip("\n")
+    details = sorted((d for p in parsers for d in p.details), key=lambda d: d["index"])
+    pass_count = sum(p.pass_count for p in parsers)
+    total = next((p.total for p in parsers if p.total is not None), None)
+    failed = [(ok, err, p) for ok, err, p in runs if not (ok and p.finished)]
+    if not failed:
+        res = {
+            "success": True,
+            "pass_count": pass_count,
+            "total": total,
+            "details": details,
+            "timing": timing,
         }
+        if len(details) < total:
+            res["stopped_early"] = True
+        # Complexity is only meaningful for correct code, and must fit in what is left of the timeout.
+        remaining = timeout_seconds - (time.time() - launched)
+        cancelled = cancel is not None and cancel.is_set()
+        if task.perf is not None and pass_count == total and remaining >= MIN_PERF_BUDGET_SECONDS and not cancelled:
+            perf_started = time.time()
+            res["perf"] = _measure_complexity(user_code, task, remaining, code_runner)
+            timing["perf_ms"] = (time.time() - perf_started) * 1000
+        return res
+    errors = [err or ("Execution failed" if not ok else "Invalid harness output") for ok, err, _ in failed]
+    res: Dict[str, Any] = {
+        "success": False,
+        "error": errors[0],
+        "raw": raw,
+        "timing": timing,
+    }
+    if cancel is not None and cancel.is_set():
+        res["cancelled"] = True
+    if total is not None:
+        # Keep what completed before a shard died and flag the case each failed shard was still running.
+        for error, (_, _, parser) in zip(errors, failed):
+            if parser.running is not None and parser.running < len(task.tests):
+                tc = task.tests[parser.running]
+                details.append({
+                    "index": parser.running,
+                    "description": tc.description,
+                    "ok": False,
+                    "expected": tc.expected_output,
+                    "output": None,
+                    "error": f"Did not finish: {error}",
+                    "hung": True,
+                })
+        details.sort(key=lambda d: d["index"])
+        res.update(pass_count=pass_count, total=total, details=details)
+    return res
+
+
+def _measure_complexity(user_code: str, task: Task, remaining_seconds: float, code_runner: str) -> Dict[str, Any]:
+    """Time the solution over task.perf.sizes in a separate run and fit its growth curve."""
+    spec = task.perf
+    budget = min(spec.time_budget_seconds, remaining_seconds)
+    parser = _EventParser()
+    # The harness stops itself after budget; the hard timeout keeps one slow size from overrunning.
+    ok, _, err = run_harness(
+        _build_perf_harness(user_code, task, budget),
+        timeout_seconds=remaining_seconds,
+        code_runner=code_runner,
+        on_stdout=parser.feed,
+    )
+    parser.close()
+    verdict = grade_complexity(parser.perf_points, spec.expected_complexity)
+    verdict["points"] = parser.perf_points
+    if not ok:
+        verdict["note"] = f"Measurement stopped early: {err}"
+    return verdict
@@ -0,0 +1,116 @@
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from cache import CACHE_DIR, tests_fingerprint
+from tasks import Task
+
+# Harnesses look their fixture up in $CT_FIXTURES_DIR when set, so a grading service on another
+# host (which sets it to its own directory) can run harnesses built by the app.
+FIXTURES_DIR_ENV = "CT_FIXTURES_DIR"
+FIXTURES_DIR = Path(os.getenv(FIXTURES_DIR_ENV) or CACHE_DIR / "fixtures")
+FIXTURE_NAME_RE = re.compile(r"^[0-9a-f]{64}\.pkl$")
+FIXTURE_MAX_FILES = 256
+# Files used more recently than this are never pruned: a child may still be about to load them.
+FIXTURE_PRUNE_GRACE_SECONDS = 3600.0
+
+_LOCK = threading.Lock()
+
+
+def _fixture_payload(task: Task) -> List[Dict[str, Any]]:
+    return [
+        {
+            "description": tc.description,
+            "args": tc.input_args,
+            "kwargs": tc.input_kwargs,
+            "expected": tc.expected_output,
+        }
+        for tc in task.tests
+    ]
+
+
+def fixture_path(task: Task) -> Path:
+    """Return the pickled test fixture file for task, writing it on first use.
+
+    Files are named by the tests fingerprint, so every run of an unchanged task reuses
+    the same file and editing a task's tests produces a new one. Pickle keeps Python
+    types (tuples, sets, bytes, ...) that JSON would lose.
+    """
+    path = FIXTURES_DIR / f"{tests_fingerprint(task)}.pkl"
+    if has_fixture(path.name):
+        return path
+    with _LOCK:
+        if not path.exists():
+            _write(path, pickle.dumps(_fixture_payload(task), protocol=pickle.HIGHEST_PROTOCOL))
+    return path
+
+
+def has_fixture(name: str) -> bool:
+    """Whether fixture file name exists; reuse refreshes its mtime, which _prune orders and spares files by."""
+    try:
+        os.utime(FIXTURES_DIR / name)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def store_fixture(name: str, data: bytes) -> Path:
+    """Save a pickled fixture received from a client (the grading service's side of fixture_path)."""
+    if not FIXTURE_NAME_RE.match(name):
+        raise ValueError(f"invalid fixture name: {name!r}")
+    path = FIXTURES_DIR / name
+    if not has_fixture(name):
+        with _LOCK:
+            if not path.exists():
+                _write(path, data)
+    return path
+
+
+def _write(path: Path, data: bytes) -> None:
+    FIXTURES_DIR.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=str(FIXTURES_DIR), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    _prune()
+
+
+def _prune() -> None:
+    files = []
+    for p in FIXTURES_DIR.glob("*.pkl"):
+        try:
+            files.append((p.stat().st_mtime, p))
+        except OSError:
+            pass
+    files.sort()
+    cutoff = time.time() - FIXTURE_PRUNE_GRACE_SECONDS
+    for mtime, stale in files[:-FIXTURE_MAX_FILES]:
+        if mtime >= cutoff:
+            break
+        try:
+            stale.unlink()
+        except OSError:
+            pass
+
+
+# Source of the loader embedded in every harness; it runs in the child process.
+LOADER_SOURCE = '''
+def _load_cases(name, default_dir):
+    import mmap, os, pickle
+    path = os.path.join(os.environ.get("CT_FIXTURES_DIR") or default_dir, name)
+    with open(path, "rb") as f:
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return pickle.loads(mm)
+        except (ValueError, OSError):
+            return pickle.load(f)
+'''
@@ -0,0 +1,162 @@
+import base64
+import http.client
+import json
+import os
+import queue
+import socket
+import subprocess
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Sequence, Set, Tuple
+from urllib.parse import urlparse
+
+from capture import HeadTailBuffer, OutputLimitExceeded
+from config import get_default_config
+from sandbox import ResourceLimitExceeded
+
+# Extra seconds allowed on top of the run timeout for queueing and transport.
+_TRANSPORT_GRACE_SECONDS = 30.0
+# Fixture names remembered as uploaded; past this the set starts over (the service answers 409 for any it lost).
+_MAX_SENT_FIXTURES = 4096
+
+
+class GradingBusy(Exception):
+    pass
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: Optional[float] = None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+class GradingClient:
+    """Thread-safe client for grading_server with a pool of keep-alive connections.
+
+    `url` is either http://host:port or unix:///path/to/socket.
+    """
+
+    def __init__(self, url: str, max_connections: int = 8, client_id: Optional[str] = None):
+        self.url = url
+        self.client_id = client_id or f"{socket.gethostname()}:{os.getpid()}"
+        self._parsed = urlparse(url)
+        self._idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue(maxsize=max_connections)
+        # Fixture files this client has uploaded; the service keeps them, so they are sent once.
+        self._sent: Set[str] = set()
+        self._sent_lock = threading.Lock()
+
+    def _new_connection(self, timeout: float) -> http.client.HTTPConnection:
+        if self._parsed.scheme == "unix":
+            return _UnixHTTPConnection(self._parsed.path, timeout=timeout)
+        return http.client.HTTPConnection(self._parsed.hostname or "127.0.0.1", self._parsed.port or 8765, timeout=timeout)
+
+    def _acquire(self, timeout: float) -> http.client.HTTPConnection:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            return self._new_connection(timeout)
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn
+
+    def _release(self, conn: http.client.HTTPConnection) -> None:
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _request(self, method: str, path: str, body: Optional[bytes], timeout: float) -> Tuple[int, Dict[str, Any]]:
+        headers = {"Content-Type": "application/json", "X-Client-Id": self.client_id}
+        # A pooled connection may have been closed by the server; retry once on a fresh one.
+        for attempt in range(2):
+            conn = self._acquire(timeout) if attempt == 0 else self._new_connection(timeout)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                resp = conn.getresponse()
+                data = resp.read()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                conn.close()
+                if attempt == 1:
+                    raise
+                continue
+            except Exception:
+                conn.close()
+                raise
+            if resp.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            return resp.status, json.loads(data or b"{}")
+        raise ConnectionError("unreachable")
+
+    def run(
+        self,
+        harness_code: str,
+        timeout_seconds: float,
+        on_stdout: Optional[Callable[[str], None]] = None,
+        fixtures: Sequence[Path] = (),
+    ) -> Tuple[int, str, str]:
+        """Run harness_code on the service. fixtures are the fixture files it loads: each is uploaded
+        the first time, and again if the service answers 409 because it no longer has it."""
+        paths = {p.name: p for p in fixtures}
+        with self._sent_lock:
+            upload = [name for name in paths if name not in self._sent]
+        for attempt in range(2):
+            request: Dict[str, Any] = {"code": harness_code, "timeout": timeout_seconds, "fixtures_needed": list(paths)}
+            if upload:
+                request["fixtures"] = {name: base64.b64encode(paths[name].read_bytes()).decode("ascii") for name in upload}
+            body = json.dumps(request).encode("utf-8")
+            status, reply = self._request("POST", "/run", body, timeout_seconds + _TRANSPORT_GRACE_SECONDS)
+            if status != 409 or attempt == 1:
+                break
+            upload = [name for name in reply.get("missing", []) if name in paths]
+        if status == 200 and paths:
+            with self._sent_lock:
+                if len(self._sent) > _MAX_SENT_FIXTURES:
+                    self._sent.clear()
+                self._sent.update(paths)
+        if status == 429:
+            raise GradingBusy(reply.get("error", "grading queue full"))
+        if status != 200:
+            raise RuntimeError(f"grading service returned {status}: {reply.get('error')}")
+        if "error" in reply:
+            raise RuntimeError(reply["error"])
+        # The service replies once per run, so stdout arrives as a single chunk.
+        if on_stdout is not None and reply["stdout"]:
+            on_stdout(reply["stdout"])
+        max_chars = get_default_config().max_output_chars
+        out = HeadTailBuffer(max_chars)
+        out.write(reply["stdout"])
+        err = HeadTailBuffer(max_chars)
+        err.write(reply["stderr"])
+        if reply.get("output_limit"):
+            raise OutputLimitExceeded(reply["output_limit"], output=out.getvalue(), stderr=err.getvalue(), dropped=out.dropped + err.dropped)
+        if reply.get("limit_error"):
+            raise ResourceLimitExceeded(reply["limit_error"], output=out.getvalue(), stderr=err.getvalue())
+        if reply["timeout"]:
+            raise subprocess.TimeoutExpired("harness.py", timeout_seconds, output=out.getvalue(), stderr=err.getvalue())
+        return reply["returncode"], out.getvalue(), err.getvalue()
+
+    def health(self) -> Dict[str, Any]:
+        _, reply = self._request("GET", "/health", None, 5.0)
+        return reply
+
+
+_CLIENT: Optional[GradingClient] = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_grading_client() -> GradingClient:
+    global _CLIENT
+    url = get_default_config().interpreter_api_url
+    with _CLIENT_LOCK:
+        if _CLIENT is None or _CLIENT.url != url:
+            _CLIENT = GradingClient(url)
+        return _CLIENT
@@ -0,0 +1,286 @@
+import argparse
+import asyncio
+import base64
+import binascii
+import json
+import os
+import subprocess
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional, Tuple, Union
+
+from capture import OutputLimitExceeded
+from fixtures import FIXTURE_NAME_RE, FIXTURES_DIR, FIXTURES_DIR_ENV, has_fixture, store_fixture
+from metrics import render_prometheus, span
+from pool import PoolExhausted, WorkerPool, fork_supported
+from runner import run_cold, run_python_in_subprocess
+from sandbox import ResourceLimitExceeded
+
+# Large enough for a request carrying the fixtures of a big test suite.
+MAX_BODY_BYTES = 64 * 1024 * 1024
+MAX_TIMEOUT_SECONDS = 30.0
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 409: "Conflict", 413: "Payload Too Large", 429: "Too Many Requests"}
+
+
+class QueueFull(Exception):
+    pass
+
+
+class _Job:
+    def __init__(self, code: str, timeout: float, future: "asyncio.Future"):
+        self.code = code
+        self.timeout = timeout
+        self.future = future
+
+
+class GradingServer:
+    """Bounded, per-client fair job queue in front of a pool of harness runners.
+
+    Jobs are queued per client id and dispatched round-robin across clients, so one
+    replica submitting a burst cannot starve the others. When the global queue or a
+    client's share is full the request is rejected with 429 instead of waiting.
+    """
+
+    def __init__(self, workers: int = 4, max_queue: int = 64, max_per_client: int = 16, max_jobs_per_worker: int = 50):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_per_client = max_per_client
+        self._queues: "OrderedDict[str, Deque[_Job]]" = OrderedDict()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="grader")
+        # Harnesses built by the app name their fixture file; children find it in this service's copy.
+        os.environ[FIXTURES_DIR_ENV] = str(FIXTURES_DIR)
+        self._pool = WorkerPool(workers, max_jobs_per_worker) if fork_supported() else None
+        self._run: Callable[..., Tuple[int, str, str]] = self._run_pooled if self._pool else run_python_in_subprocess
+
+    def submit(self, client_id: str, code: str, timeout: float) -> "asyncio.Future":
+        q = self._queues.get(client_id)
+        if self._queued >= self.max_queue or (q is not None and len(q) >= self.max_per_client):
+            self._rejected += 1
+            raise QueueFull()
+        if q is None:
+            q = self._queues[client_id] = deque()
+        future = asyncio.get_running_loop().create_future()
+        q.append(_Job(code, timeout, future))
+        self._queued += 1
+        self._wakeup.set()
+        return future
+
+    def _next_job(self) -> Optional[_Job]:
+        # Round-robin: take from the first client, then move it to the back.
+        while self._queues:
+            client_id, q = next(iter(self._queues.items()))
+            if not q:
+                del self._queues[client_id]
+                continue
+            job = q.popleft()
+            self._queued -= 1
+            if q:
+                self._queues.move_to_end(client_id)
+            else:
+                del self._queues[client_id]
+            return job
+        return None
+
+    def _run_pooled(self, code: str, timeout: float, on_stdout: Callable[[str], None]) -> Tuple[int, str, str]:
+        try:
+            return self._pool.run(code, timeout, on_stdout)
+        except PoolExhausted:
+            # The executor runs at most one job per worker, so this is rare; never hold a job back.
+            return run_cold(code, timeout, on_stdout)
+
+    def _execute(self, job: _Job) -> Dict[str, Any]:
+        # The runner keeps only the head and tail of stdout, but the client needs every harness
+        # event line, so the full stream is collected here; MAX_OUTPUT_BYTES bounds its size.
+        chunks = []
+        try:
+            with span("grading_service_run") as labels:
+                rc, _, err = self._run(job.code, job.timeout, chunks.append)
+                labels["outcome"] = "ok" if rc == 0 else "nonzero_exit"
+            return {"returncode": rc, "stdout": "".join(chunks), "stderr": err, "timeout": False}
+        except subprocess.TimeoutExpired as e:
+            return {"returncode": None, "stdout": "".join(chunks), "stderr": _text(e.stderr), "timeout": True}
+        except ResourceLimitExceeded as e:
+            return {
+                "returncode": None,
+                "stdout": "".join(chunks),
+                "stderr": e.stderr,
+                "timeout": False,
+                "limit_error": str(e),
+            }
+        except OutputLimitExceeded as e:
+            return {
+                "returncode": None,
+                "stdout": "".join(chunks),
+                "stderr": e.stderr,
+                "timeout": False,
+                "output_limit": e.limit,
+            }
+        except Exception as e:
+            return {"error": f"Runner error: {str(e)}"}
+
+    async def _worker_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            job = self._next_job()
+            if job is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            if job.future.cancelled():
+                continue
+            self._running += 1
+            try:
+                reply = await loop.run_in_executor(self._executor, self._execute, job)
+            finally:
+                self._running -= 1
+            self._completed += 1
+            if not job.future.done():
+                job.future.set_result(reply)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queued": self._queued,
+            "running": self._running,
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "clients": len(self._queues),
+            "max_queue": self.max_queue,
+        }
+
+    async def _handle_request(self, method: str, path: str, headers: Dict[str, str], body: bytes) -> Tuple[int, Union[Dict[str, Any], str]]:
+        if method == "GET" and path == "/health":
+            return 200, self.stats()
+        if method == "GET" and path == "/metrics":
+            return 200, render_prometheus()
+        if method != "POST" or path != "/run":
+            return 404, {"error": "not found"}
+        try:
+            req = json.loads(body)
+            code = req["code"]
+            timeout = min(float(req.get("timeout", 3)), MAX_TIMEOUT_SECONDS)
+            uploads = {name: base64.b64decode(data, validate=True) for name, data in (req.get("fixtures") or {}).items()}
+            needed = [str(name) for name in req.get("fixtures_needed") or []]
+        except (ValueError, KeyError, TypeError, AttributeError, binascii.Error):
+            return 400, {"error": "expected JSON body with 'code' and 'timeout'"}
+        try:
+            for name, data in uploads.items():
+                await asyncio.get_running_loop().run_in_executor(None, store_fixture, name, data)
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        if not all(FIXTURE_NAME_RE.match(name) for name in needed):
+            return 400, {"error": "invalid fixture name"}
+        missing = [name for name in needed if not has_fixture(name)]
+        if missing:
+            return 409, {"error": "missing fixtures", "missing": missing}
+        client_id = headers.get("x-client-id") or "anonymous"
+        try:
+            future = self.submit(client_id, code, timeout)
+        except QueueFull:
+            return 429, {"error": "grading queue full"}
+        return 200, await future
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                except ValueError:
+                    break
+                headers: Dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {"error": "body too large"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await self._handle_request(method, path, headers, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, payload: Union[Dict[str, Any], str], keep_alive: bool) -> None:
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body, content_type = json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json"
+        head = [
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if status == 429:
+            head.append("Retry-After: 1")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765, unix_socket: Optional[str] = None) -> None:
+        self._wakeup = asyncio.Event()
+        workers = [asyncio.create_task(self._worker_loop()) for _ in range(self.workers)]
+        if unix_socket:
+            if os.path.exists(unix_socket):
+                os.unlink(unix_socket)
+            server = await asyncio.start_unix_server(self.handle_connection, path=unix_socket)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host=host, port=port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for w in workers:
+                w.cancel()
+            self._executor.shutdown(wait=False)
+            if self._pool is not None:
+                self._pool.close()
+
+
+def _text(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return value
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Code_Teacher grading service (interpreter_api runner).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix-socket", default=None, help="Listen on a unix socket instead of TCP.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--max-queue", type=int, default=64)
+    parser.add_argument("--max-per-client", type=int, default=16)
+    parser.add_argument("--max-jobs-per-worker", type=int, default=50)
+    args = parser.parse_args()
+
+    server = GradingServer(args.workers, args.max_queue, args.max_per_client, args.max_jobs_per_worker)
+    where = args.unix_socket or f"{args.host}:{args.port}"
+    print(f"Grading service listening on {where} with {args.workers} workers")
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix_socket))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
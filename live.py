@@ -0,0 +1,65 @@
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class LiveRunner:
+    """Runs the latest submission in the background once edits pause for debounce_seconds.
+
+    Each submit cancels the run it supersedes (fn receives the cancel event and is expected to
+    stop and kill its child when it is set), so only the newest submission's result is kept.
+    """
+
+    def __init__(self, debounce_seconds: float = 0.8):
+        self.debounce_seconds = debounce_seconds
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._cancel: Optional[threading.Event] = None
+        self._key: Optional[str] = None
+        self._result: Optional[Tuple[str, Dict[str, Any]]] = None
+
+    def submit(self, key: str, fn: Callable[[threading.Event], Dict[str, Any]]) -> None:
+        """Schedule fn(cancel) for key, cancelling any pending or running earlier submission."""
+        with self._lock:
+            if self._cancel is not None:
+                self._cancel.set()
+            self._generation += 1
+            generation = self._generation
+            cancel = self._cancel = threading.Event()
+            self._key = key
+        threading.Thread(target=self._run, args=(generation, key, fn, cancel), name="ct-live", daemon=True).start()
+
+    def _run(self, generation: int, key: str, fn: Callable[[threading.Event], Dict[str, Any]], cancel: threading.Event) -> None:
+        # A newer submit during the quiet period sets cancel, so a burst of edits starts one run.
+        if cancel.wait(self.debounce_seconds):
+            return
+        try:
+            result = fn(cancel)
+        except Exception as e:
+            result = {"success": False, "error": f"Live run failed: {e}"}
+        with self._lock:
+            if generation == self._generation and not cancel.is_set():
+                self._result = (key, result)
+                self._cancel = None
+
+    @property
+    def submitted_key(self) -> Optional[str]:
+        with self._lock:
+            return self._key
+
+    @property
+    def busy(self) -> bool:
+        """True while the latest submission is waiting out the debounce or still running."""
+        with self._lock:
+            return self._cancel is not None
+
+    def latest(self) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """(key, result) of the newest finished submission that was not superseded."""
+        with self._lock:
+            return self._result
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._cancel is not None:
+                self._cancel.set()
+                self._cancel = None
+            self._generation += 1
@@ -1,23 +1,111 @@
-from typing import Any, Dict, Optional
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+import hashlib
+import importlib
 import os
+import random
+import threading
+import time
 
-try:
-    from langchain_openai import ChatOpenAI
-except Exception:
-    ChatOpenAI = None  # type: ignore
+from cache import CACHE_DIR, DiskCache, LRUCache, SingleFlight
+from config import get_default_config
+from metrics import span
+from prompts import CHARS_PER_TOKEN, estimate_tokens, format_failures, relevant_code
+from utils import truncate_text
 
-try:
-    from langchain_ollama import ChatOllama
-except Exception:
-    ChatOllama = None  # type: ignore
+# Chat model class per provider. The langchain packages take seconds to import, so they are
+# loaded on first use and never at startup (e.g. with provider "None" they are not loaded at all).
+_PROVIDER_CLASSES = {
+    "OpenAI": ("langchain_openai", "ChatOpenAI"),
+    "Ollama": ("langchain_ollama", "ChatOllama"),
+}
+_LOADED_CLASSES: Dict[str, Any] = {}
+_LOADED_CLASSES_LOCK = threading.Lock()
+
+
+def provider_class(provider: str):
+    """The provider's chat model class, or None if its package is missing; the outcome is cached per process."""
+    with _LOADED_CLASSES_LOCK:
+        if provider not in _LOADED_CLASSES:
+            cls = None
+            if provider in _PROVIDER_CLASSES:
+                module, attr = _PROVIDER_CLASSES[provider]
+                try:
+                    cls = getattr(importlib.import_module(module), attr)
+                except Exception:
+                    cls = None
+            _LOADED_CLASSES[provider] = cls
+        return _LOADED_CLASSES[provider]
+
+
+# Live chat clients keyed by (provider, model, temperature, base_url, credential hash).
+_CLIENTS: "OrderedDict[Tuple[Any, ...], Any]" = OrderedDict()
+_CLIENTS_LOCK = threading.Lock()
+_MAX_CLIENTS = 32
+_HTTP_CLIENT = None
+_HTTP_CLIENT_LOCK = threading.Lock()
+
+
+def _shared_http_client():
+    """One keep-alive connection pool shared by every OpenAI client, or None without httpx."""
+    global _HTTP_CLIENT
+    with _HTTP_CLIENT_LOCK:
+        if _HTTP_CLIENT is None:
+            try:
+                import httpx
+            except Exception:
+                return None
+            cfg = get_default_config()
+            _HTTP_CLIENT = httpx.Client(
+                timeout=cfg.llm_timeout_seconds,
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=16, keepalive_expiry=60),
+            )
+        return _HTTP_CLIENT
+
+
+def _registered(key: Tuple[Any, ...], factory: Callable[[], Any]):
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            client = _CLIENTS[key] = factory()
+            while len(_CLIENTS) > _MAX_CLIENTS:
+                _CLIENTS.popitem(last=False)
+        _CLIENTS.move_to_end(key)
+        return client
+
+
+def _make_ollama(model: str, base_url: str, temperature: float, timeout: float):
+    ChatOllama = provider_class("Ollama")
+    try:
+        return ChatOllama(model=model, base_url=base_url, temperature=temperature, client_kwargs={"timeout": timeout})
+    except Exception:
+        # Older langchain-ollama releases have no client_kwargs.
+        return ChatOllama(model=model, base_url=base_url, temperature=temperature)
 
 
 def make_llm(provider: str, model: str, temperature: float):
-    if provider == "OpenAI" and ChatOpenAI is not None and os.getenv("OPENAI_API_KEY"):
-        return ChatOpenAI(model=model, temperature=temperature, api_key=os.getenv("OPENAI_API_KEY"))
-    if provider == "Ollama" and ChatOllama is not None:
+    """Return a shared chat client for these settings, creating it on first use."""
+    cfg = get_default_config()
+    api_key = os.getenv("OPENAI_API_KEY")
+    if provider == "OpenAI" and api_key and provider_class("OpenAI") is not None:
+        ChatOpenAI = provider_class("OpenAI")
+        base_url = os.getenv("OPENAI_BASE_URL") or None
+        key = (provider, model, float(temperature), base_url, hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16])
+        # Retries are handled by _invoke so both providers share one backoff policy.
+        return _registered(key, lambda: ChatOpenAI(
+            model=model,
+            temperature=temperature,
+            api_key=api_key,
+            base_url=base_url,
+            timeout=cfg.llm_timeout_seconds,
+            max_retries=0,
+            http_client=_shared_http_client(),
+        ))
+    if provider == "Ollama" and provider_class("Ollama") is not None:
         base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
-        return ChatOllama(model=model, base_url=base_url, temperature=temperature)
+        key = (provider, model, float(temperature), base_url, None)
+        return _registered(key, lambda: _make_ollama(model, base_url, temperature, cfg.llm_timeout_seconds))
     return None
 
 
@@ -26,35 +114,317 @@ HINT_SYSTEM_PROMPT = (
 )
 
 
-def build_hint_prompt(task_title: str, task_description: str, failing_details: str, user_code: str) -> str:
-    return (
-        f"Task: {task_title}\n"
-        f"Description: {task_description}\n"
-        f"Failing details: {failing_details}\n"
-        f"User code:\n{user_code}\n\n"
-        "Give 1-3 short hints (bullet list), focusing on the bug or missing cases."
-    )
+# Share of the token budget left after the static task context that failing cases may use.
+_FAILURES_BUDGET_SHARE = 0.4
 
 
-def build_explain_prompt(task_title: str, task_description: str, user_code: str) -> str:
-    return (
-        f"Task: {task_title}\n"
-        f"Description: {task_description}\n"
-        f"User code:\n{user_code}\n\n"
-        "Explain what this code does and suggest one improvement."
+def _task_context(task_title: str, task_description: str, instruction: str) -> str:
+    # Static per-task text goes first and never changes between attempts, so
+    # providers with prefix caching can reuse it across requests.
+    return f"Task: {task_title}\nDescription: {task_description}\nInstructions: {instruction}\n"
+
+
+def build_hint_prompt(
+    task_title: str,
+    task_description: str,
+    failing_details: Union[str, Sequence[Dict[str, Any]]],
+    user_code: str,
+    function_name: Optional[str] = None,
+    max_tokens: Optional[int] = None,
+) -> str:
+    """Hint prompt kept within max_tokens (default Config.llm_prompt_token_budget).
+
+    failing_details is the list of per-case result dicts from the evaluator; they are
+    deduplicated and grouped by failure kind. A preformatted string is used as-is.
+    """
+    cfg = get_default_config()
+    budget = max_tokens or cfg.llm_prompt_token_budget
+    head = _task_context(
+        task_title, task_description, "Give 1-3 short hints (bullet list), focusing on the bug or missing cases."
     )
+    remaining = max(budget - estimate_tokens(head + "Failing details: \nUser code:\n\n"), 0)
+    if isinstance(failing_details, str):
+        failures = truncate_text(failing_details, int(remaining * _FAILURES_BUDGET_SHARE) * CHARS_PER_TOKEN)
+    else:
+        failures = format_failures(failing_details, int(remaining * _FAILURES_BUDGET_SHARE))
+    remaining = max(remaining - estimate_tokens(failures) - 1, 0)
+    code = relevant_code(user_code, function_name, remaining, cfg.max_output_chars)
+    return f"{head}Failing details: {failures}\nUser code:\n{code}\n"
 
 
-def ask_llm_for_text(provider: str, model: str, temperature: float, prompt: str) -> Optional[str]:
+def build_explain_prompt(
+    task_title: str,
+    task_description: str,
+    user_code: str,
+    function_name: Optional[str] = None,
+    max_tokens: Optional[int] = None,
+) -> str:
+    cfg = get_default_config()
+    budget = max_tokens or cfg.llm_prompt_token_budget
+    head = _task_context(task_title, task_description, "Explain what this code does and suggest one improvement.")
+    remaining = max(budget - estimate_tokens(head + "User code:\n\n"), 0)
+    code = relevant_code(user_code, function_name, remaining, cfg.max_output_chars)
+    return f"{head}User code:\n{code}\n"
+
+
+def normalize_prompt(prompt: str) -> str:
+    # Trailing spaces and runs of blank lines do not change the answer; indentation might.
+    lines = [line.rstrip() for line in prompt.strip().splitlines()]
+    out = []
+    for line in lines:
+        if line or (out and out[-1]):
+            out.append(line)
+    return "\n".join(out)
+
+
+class LLMCache:
+    """Exact-match answer cache: memory LRU over an SQLite tier, both with TTL expiry."""
+
+    def __init__(self, disk_path, ttl_seconds: float, max_memory_items: int = 256, max_disk_bytes: int = 32 * 1024 * 1024):
+        self.memory = LRUCache(max_memory_items, ttl_seconds)
+        self.disk = DiskCache(disk_path, max_disk_bytes, ttl_seconds)
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def key(provider: str, model: str, temperature: float, prompt: str) -> str:
+        raw = "\0".join([provider, model, f"{float(temperature):.3f}", normalize_prompt(prompt)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        text = self.memory.get(key)
+        if text is None:
+            blob = self.disk.get(key)
+            if blob is not None:
+                text = blob.decode("utf-8")
+                self.memory.put(key, text)
+        if text is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        self.memory.put(key, text)
+        self.disk.put(key, text.encode("utf-8"))
+
+    def stats(self) -> Dict[str, Any]:
+        # Coalesced requests missed the cache but still shared another request's upstream call.
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "upstream_calls": self.misses - self.coalesced,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+
+
+_LLM_CACHE: Optional[LLMCache] = None
+_LLM_CACHE_PATH: Optional[Path] = CACHE_DIR / "llm.sqlite3"
+_LLM_CACHE_LOCK = threading.Lock()
+_IN_FLIGHT = SingleFlight()
+
+
+def configure_llm_cache(path: Optional[Path]) -> None:
+    """Keep this process's answer cache at path instead of .cache/ (None disables it), e.g. for load tests."""
+    global _LLM_CACHE, _LLM_CACHE_PATH
+    with _LLM_CACHE_LOCK:
+        _LLM_CACHE, _LLM_CACHE_PATH = None, path
+
+
+def get_llm_cache() -> Optional[LLMCache]:
+    global _LLM_CACHE
+    cfg = get_default_config()
+    if not cfg.llm_cache_enabled:
+        return None
+    with _LLM_CACHE_LOCK:
+        if _LLM_CACHE_PATH is None:
+            return None
+        if _LLM_CACHE is None:
+            _LLM_CACHE = LLMCache(
+                _LLM_CACHE_PATH,
+                ttl_seconds=cfg.llm_cache_ttl_seconds,
+                max_memory_items=cfg.llm_cache_memory_items,
+                max_disk_bytes=cfg.llm_cache_max_mb * 1024 * 1024,
+            )
+        return _LLM_CACHE
+
+
+class _LLMFailed(Exception):
+    pass
+
+
+_RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+_RETRYABLE_NAMES = {"APITimeoutError", "APIConnectionError", "RateLimitError", "InternalServerError", "TimeoutException", "ConnectError", "ReadTimeout", "ConnectTimeout", "RemoteProtocolError"}
+
+
+def _is_retryable(e: Exception) -> bool:
+    status = getattr(e, "status_code", None) or getattr(getattr(e, "response", None), "status_code", None)
+    return status in _RETRYABLE_STATUS or type(e).__name__ in _RETRYABLE_NAMES or isinstance(e, (TimeoutError, ConnectionError))
+
+
+def _with_retries(fn: Callable[[], Any]) -> Any:
+    """Call fn, retrying transient failures with exponential backoff and jitter."""
+    cfg = get_default_config()
+    for attempt in range(cfg.llm_max_retries + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt >= cfg.llm_max_retries or not _is_retryable(e):
+                raise _LLMFailed(str(e))
+            time.sleep(cfg.llm_retry_backoff_seconds * (2 ** attempt) * (0.5 + random.random()))
+
+
+def _invoke(provider: str, model: str, temperature: float, prompt: str, on_token: Optional[Callable[[str], None]] = None) -> Optional[str]:
     llm = make_llm(provider, model, temperature)
     if llm is None:
         return None
-    try:
+    if on_token is None:
         # Both ChatOpenAI and ChatOllama implement invoke for LCEL
-        resp = llm.invoke(prompt)
+        resp = _with_retries(lambda: llm.invoke(prompt))
         if hasattr(resp, "content"):
             return resp.content
         # fallback: str
         return str(resp)
-    except Exception as e:
-        return f"LLM error: {str(e)}"
+
+    def consume() -> str:
+        parts = []
+        try:
+            for chunk in llm.stream(prompt):
+                piece = chunk.content if hasattr(chunk, "content") else str(chunk)
+                if piece:
+                    parts.append(piece)
+                    on_token(piece)
+        except Exception as e:
+            if parts:
+                # Tokens were already delivered; retrying would repeat them.
+                raise _LLMFailed(str(e))
+            raise
+        return "".join(parts)
+
+    return _with_retries(consume)
+
+
+def ask_llm(provider: str, model: str, temperature: float, prompt: str, on_token: Optional[Callable[[str], None]] = None) -> Tuple[Optional[str], bool]:
+    """Return (text, cached). cached is True when the answer came from the cache or a coalesced call.
+
+    With on_token, a fresh answer is streamed and on_token receives each piece as it arrives;
+    cached or coalesced answers are returned whole without calling on_token.
+    """
+    with span("ask_llm", provider=provider, model=model) as labels:
+        text, cached = _ask_llm(provider, model, temperature, prompt, on_token)
+        if text is None:
+            labels["outcome"] = "unconfigured"
+        elif text.startswith("LLM error:"):
+            labels["outcome"] = "error"
+        elif cached:
+            labels["outcome"] = "cached"
+        return text, cached
+
+
+def _ask_llm(provider: str, model: str, temperature: float, prompt: str, on_token: Optional[Callable[[str], None]]) -> Tuple[Optional[str], bool]:
+    cache = get_llm_cache()
+    if cache is None:
+        try:
+            return _invoke(provider, model, temperature, prompt, on_token), False
+        except _LLMFailed as e:
+            return f"LLM error: {str(e)}", False
+
+    key = LLMCache.key(provider, model, temperature, prompt)
+    text = cache.get(key)
+    if text is not None:
+        return text, True
+
+    def call() -> Optional[str]:
+        answer = _invoke(provider, model, temperature, prompt, on_token)
+        if answer:
+            cache.put(key, answer)
+        return answer
+
+    # Identical concurrent requests share one upstream call; errors are never cached.
+    try:
+        text, shared = _IN_FLIGHT.do(key, call)
+    except _LLMFailed as e:
+        return f"LLM error: {str(e)}", False
+    if shared:
+        cache.coalesced += 1
+    return text, shared
+
+
+def ask_llm_for_text(provider: str, model: str, temperature: float, prompt: str) -> Optional[str]:
+    return ask_llm(provider, model, temperature, prompt)[0]
+
+
+class LLMStream:
+    """An answer produced on a background thread.
+
+    Iterating yields text chunks as they arrive; iteration can be repeated (e.g. on a
+    Streamlit rerun) and replays from the first chunk. ttft_ms and total_ms are set as
+    the first chunk and the end of the answer arrive.
+    """
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.cached = False
+        self.configured = True
+        self.ttft_ms: Optional[float] = None
+        self.total_ms: Optional[float] = None
+        self._started = time.perf_counter()
+        self._cond = threading.Condition()
+
+    @property
+    def text(self) -> str:
+        with self._cond:
+            return "".join(self.chunks)
+
+    def _put(self, chunk: str) -> None:
+        with self._cond:
+            if self.ttft_ms is None:
+                self.ttft_ms = (time.perf_counter() - self._started) * 1000
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def _finish(self) -> None:
+        with self._cond:
+            self.total_ms = (time.perf_counter() - self._started) * 1000
+            self.done = True
+            self._cond.notify_all()
+
+    def __iter__(self) -> Iterator[str]:
+        i = 0
+        while True:
+            with self._cond:
+                while i >= len(self.chunks) and not self.done:
+                    self._cond.wait()
+                pending = self.chunks[i:]
+                if not pending:
+                    return
+            i += len(pending)
+            yield from pending
+
+
+def stream_llm(provider: str, model: str, temperature: float, prompt: str) -> LLMStream:
+    """Start answering prompt in the background and return the stream immediately."""
+    stream = LLMStream()
+
+    def produce() -> None:
+        try:
+            text, cached = ask_llm(provider, model, temperature, prompt, on_token=stream._put)
+            stream.cached = cached
+            if text is None:
+                stream.configured = False
+            elif not stream.chunks:
+                stream._put(text)
+            elif text != stream.text:
+                # Failed part-way: keep the partial answer and append the error.
+                stream._put("\n\n" + text)
+        except Exception as e:
+            stream._put(f"LLM error: {str(e)}")
+        finally:
+            stream._finish()
+
+    threading.Thread(target=produce, name="llm-stream", daemon=True).start()
+    return stream
@@ -0,0 +1,204 @@
+import contextvars
+import functools
+import json
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from config import get_default_config
+
+METRIC_PREFIX = "code_teacher_"
+
+# Upper bounds in seconds of the latency histogram buckets (+Inf is implicit).
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Outcome label for a span that raised, by exception class name (so this module imports nothing else).
+EXCEPTION_OUTCOMES = {
+    "TimeoutExpired": "timeout",
+    "RunCancelled": "cancelled",
+    "OutputLimitExceeded": "output_limit",
+    "ResourceLimitExceeded": "resource_limit",
+    "GradingBusy": "busy",
+}
+
+_LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Latency histogram per label set, rendered in the Prometheus text format."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        # label key -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series: Dict[_LabelKey, List[Any]] = {}
+
+    def observe(self, seconds: float, labels: Dict[str, str]) -> None:
+        key = tuple(sorted(labels.items()))
+        idx = bisect_left(BUCKETS, seconds)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+            series[0][idx] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        metric = f"{METRIC_PREFIX}{self.name}_seconds"
+        lines = [f"# HELP {metric} Duration of {self.name} calls.", f"# TYPE {metric} histogram"]
+        with self._lock:
+            series = sorted((key, [list(s[0]), s[1], s[2]]) for key, s in self._series.items())
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, n in zip(BUCKETS + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{metric}_bucket{_labels(key + (('le', le),))} {cumulative}")
+            lines.append(f"{metric}_sum{_labels(key)} {total}")
+            lines.append(f"{metric}_count{_labels(key)} {count}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(key: _LabelKey) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in key) + "}"
+
+
+_HISTOGRAMS: Dict[str, Histogram] = {}
+_HISTOGRAMS_LOCK = threading.Lock()
+
+
+def histogram(name: str) -> Histogram:
+    with _HISTOGRAMS_LOCK:
+        hist = _HISTOGRAMS.get(name)
+        if hist is None:
+            hist = _HISTOGRAMS[name] = Histogram(name)
+        return hist
+
+
+def render_prometheus() -> str:
+    with _HISTOGRAMS_LOCK:
+        hists = sorted(_HISTOGRAMS.items())
+    lines: List[str] = []
+    for _, hist in hists:
+        lines.extend(hist.render())
+    return "\n".join(lines) + "\n"
+
+
+class _TraceLog:
+    """Append-only JSON-lines log of finished spans; one trace id per top-level span."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+
+_CFG = get_default_config()
+_TRACE_LOG: Optional[_TraceLog] = _TraceLog(_CFG.trace_log) if _CFG.metrics_enabled and _CFG.trace_log else None
+# (trace id, span id) of the innermost open span in this context.
+_CURRENT: "contextvars.ContextVar[Optional[Tuple[str, str]]]" = contextvars.ContextVar("ct_span", default=None)
+
+
+@contextmanager
+def span(name: str, **labels: str) -> Iterator[Dict[str, str]]:
+    """Time the block into the name histogram, labelled with labels plus an outcome.
+
+    The yielded dict is the label set: the block may fill in outcome (and other labels) once it
+    knows them. Otherwise outcome is "ok", or derived from the exception that left the block.
+    """
+    if not _CFG.metrics_enabled:
+        yield labels
+        return
+    token = None
+    if _TRACE_LOG is not None:
+        parent = _CURRENT.get()
+        trace_id = parent[0] if parent else uuid.uuid4().hex[:16]
+        span_id = uuid.uuid4().hex[:8]
+        token = _CURRENT.set((trace_id, span_id))
+    started_at = time.time()
+    started = time.perf_counter()
+    try:
+        yield labels
+    except BaseException as e:
+        labels.setdefault("outcome", EXCEPTION_OUTCOMES.get(type(e).__name__, "error"))
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        labels.setdefault("outcome", "ok")
+        histogram(name).observe(elapsed, labels)
+        if token is not None:
+            _CURRENT.reset(token)
+            _TRACE_LOG.write({
+                "ts": started_at,
+                "trace": trace_id,
+                "span": span_id,
+                "parent": parent[1] if parent else None,
+                "name": name,
+                "ms": round(elapsed * 1000, 3),
+                **labels,
+            })
+
+
+def timed(name: str, **labels: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Decorator running every call of the function in span(name, **labels)."""
+
+    def decorate(fn: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(name, **labels):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_SERVER: Optional[ThreadingHTTPServer] = None
+_SERVER_LOCK = threading.Lock()
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> Optional[ThreadingHTTPServer]:
+    """Serve GET /metrics on a daemon thread. Once per process; later calls return the same server."""
+    global _SERVER
+    with _SERVER_LOCK:
+        if _SERVER is None and port > 0:
+            try:
+                _SERVER = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError:
+                # Another process (e.g. a second app replica on this host) already serves the port.
+                return None
+            _SERVER.daemon_threads = True
+            threading.Thread(target=_SERVER.serve_forever, name="ct-metrics", daemon=True).start()
+        return _SERVER
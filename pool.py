@@ -0,0 +1,439 @@
+import codecs
+import json
+import os
+import queue
+import select
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import types
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from capture import HeadTailBuffer, OutputLimitExceeded, RunCancelled
+from config import get_default_config
+from sandbox import ResourceLimitExceeded, apply_limits, describe_limit_exit, limits_for, open_cgroup
+
+# Extra seconds the parent waits for a worker reply before declaring the worker dead.
+_REPLY_GRACE_SECONDS = 2.0
+
+# How often a waiting request checks its cancel event.
+_CANCEL_POLL_SECONDS = 0.05
+
+
+def fork_supported() -> bool:
+    return hasattr(os, "fork") and sys.platform != "win32"
+
+
+# --- worker side ---
+
+def _exec_harness(harness_path: Path) -> int:
+    """Body of the forked child: execute harness_path as __main__ and return an exit code."""
+    sys.argv = [str(harness_path)]
+    sys.path[0] = str(harness_path.parent)
+    module = types.ModuleType("__main__")
+    module.__file__ = str(harness_path)
+    sys.modules["__main__"] = module
+    try:
+        code = compile(harness_path.read_text(encoding="utf-8"), str(harness_path), "exec")
+        exec(code, module.__dict__)
+        return 0
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        print(e.code, file=sys.stderr)
+        return 1
+    except SyntaxError as e:
+        sys.stderr.write("".join(traceback.format_exception_only(type(e), e)))
+        return 1
+    except BaseException as e:
+        # Drop this frame so the traceback looks like a plain `python harness.py` run.
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        return 1
+
+
+def _run_forked(
+    code: str,
+    timeout: float,
+    emit: Callable[[Dict[str, Any]], None],
+    max_output_bytes: Optional[int] = None,
+    limits: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Fork a child running code, relay its output through emit as it arrives, and enforce timeout.
+
+    The child is killed once stdout and stderr together exceed max_output_bytes, and runs
+    under the rlimits (and optional cgroup) described by limits.
+    """
+    tmpdir = Path(tempfile.mkdtemp(prefix="ct_runner_"))
+    cgroup = open_cgroup(limits) if limits else None
+    try:
+        harness_path = tmpdir / "harness.py"
+        harness_path.write_text(code, encoding="utf-8")
+        out_r, out_w = os.pipe()
+        err_r, err_w = os.pipe()
+
+        pid = os.fork()
+        if pid == 0:
+            rc = 1
+            try:
+                os.setsid()
+                os.chdir(str(tmpdir))
+                devnull = os.open(os.devnull, os.O_RDONLY)
+                os.dup2(devnull, 0)
+                os.dup2(out_w, 1)
+                os.dup2(err_w, 2)
+                for fd in (devnull, out_r, out_w, err_r, err_w):
+                    os.close(fd)
+                if limits:
+                    apply_limits(limits, str(cgroup.path) if cgroup else None)
+                rc = _exec_harness(harness_path)
+            finally:
+                try:
+                    sys.stdout.flush()
+                    sys.stderr.flush()
+                finally:
+                    os._exit(rc & 0xFF)
+
+        os.close(out_w)
+        os.close(err_w)
+        emit({"started": pid})
+        streams = {
+            out_r: ("out", codecs.getincrementaldecoder("utf-8")(errors="replace")),
+            err_r: ("err", codecs.getincrementaldecoder("utf-8")(errors="replace")),
+        }
+        deadline = time.monotonic() + timeout
+        timed_out = False
+        output_bytes = 0
+        over_limit = False
+        try:
+            while streams:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    timed_out = True
+                    _kill_group(pid)
+                    _drain(streams, emit)
+                    break
+                ready, _, _ = select.select(list(streams), [], [], remaining)
+                for fd in ready:
+                    output_bytes += _relay(fd, streams, emit)
+                if max_output_bytes is not None and output_bytes > max_output_bytes:
+                    # Whatever is still in the pipes is dropped unread.
+                    over_limit = True
+                    _kill_group(pid)
+                    break
+            status = _wait(pid, deadline)
+            if status is None:
+                timed_out = True
+                _kill_group(pid)
+                _, status = os.waitpid(pid, 0)
+        finally:
+            for fd in streams:
+                os.close(fd)
+        return {
+            "done": True,
+            "returncode": os.waitstatus_to_exitcode(status),
+            "timeout": timed_out,
+            "output_limit": over_limit,
+            "oom_killed": cgroup.oom_killed() if cgroup else False,
+        }
+    finally:
+        if cgroup is not None:
+            cgroup.close()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def _relay(fd: int, streams: Dict[int, Tuple[str, Any]], emit: Callable[[Dict[str, Any]], None]) -> int:
+    """Forward one chunk from fd and return its size in bytes; at EOF forget fd and return 0."""
+    name, decoder = streams[fd]
+    data = os.read(fd, 65536)
+    text = decoder.decode(data, final=not data)
+    if text:
+        emit({"stream": name, "data": text})
+    if not data:
+        del streams[fd]
+        os.close(fd)
+    return len(data)
+
+
+def _drain(streams: Dict[int, Tuple[str, Any]], emit: Callable[[Dict[str, Any]], None]) -> None:
+    # After the child group is killed, pick up whatever it managed to write.
+    while streams:
+        ready, _, _ = select.select(list(streams), [], [], 0.05)
+        if not ready:
+            return
+        for fd in ready:
+            _relay(fd, streams, emit)
+
+
+def _wait(pid: int, deadline: float) -> Optional[int]:
+    delay = 0.0005
+    while True:
+        done_pid, status = os.waitpid(pid, os.WNOHANG)
+        if done_pid == pid:
+            return status
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(delay)
+        delay = min(delay * 2, 0.01)
+
+
+def _kill_group(pid: int) -> None:
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+def _serve() -> None:
+    """Worker loop: read one JSON request per line on stdin, answer with JSON frames on stdout.
+
+    A {"started": pid} frame announces the child, its output is relayed as
+    {"stream": "out"|"err", "data": ...} frames while it runs, and a final
+    {"done": true, ...} (or {"error": ...}) frame ends the reply.
+    """
+    stdin = sys.stdin.buffer
+    stdout = sys.stdout.buffer
+
+    def emit(frame: Dict[str, Any]) -> None:
+        stdout.write(json.dumps(frame).encode("utf-8") + b"\n")
+        stdout.flush()
+
+    for line in stdin:
+        if not line.strip():
+            continue
+        try:
+            req = json.loads(line)
+            reply = _run_forked(req["code"], float(req["timeout"]), emit, req.get("max_output_bytes"), req.get("limits"))
+        except Exception as e:
+            reply = {"error": f"{type(e).__name__}: {e}"}
+        emit(reply)
+
+
+# --- parent side ---
+
+class WorkerDied(Exception):
+    pass
+
+
+class _Worker:
+    def __init__(self):
+        self.jobs = 0
+        self.child_pid: Optional[int] = None
+        self._buf = bytearray()
+        self.proc = subprocess.Popen(
+            [sys.executable, "-u", str(Path(__file__).resolve())],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=tempfile.gettempdir(),
+        )
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def _read_frame(self, deadline: float, poll: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Next reply frame; with poll set, None if nothing arrived within poll seconds."""
+        fd = self.proc.stdout.fileno()
+        while b"\n" not in self._buf:
+            remaining = deadline - time.monotonic()
+            wait = max(remaining, 0) if poll is None else max(min(remaining, poll), 0)
+            ready, _, _ = select.select([fd], [], [], wait)
+            if not ready:
+                if remaining > wait:
+                    return None
+                raise WorkerDied("worker did not reply in time")
+            data = os.read(fd, 65536)
+            if not data:
+                raise WorkerDied("worker exited")
+            self._buf += data
+        line, _, rest = bytes(self._buf).partition(b"\n")
+        self._buf = bytearray(rest)
+        return json.loads(line)
+
+    def request(
+        self,
+        code: str,
+        timeout: float,
+        on_stdout: Optional[Callable[[str], None]] = None,
+        max_output_bytes: Optional[int] = None,
+        max_output_chars: int = 8000,
+        limits: Optional[Dict[str, Any]] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> Tuple[Dict[str, Any], HeadTailBuffer, HeadTailBuffer]:
+        """Run code in a forked child; returns the final frame and bounded stdout/stderr buffers.
+
+        on_stdout still sees every stdout chunk, so harness events past max_output_chars are not lost.
+        Setting cancel kills the child; the worker then finishes the reply as usual and stays reusable.
+        """
+        request = {"code": code, "timeout": timeout, "max_output_bytes": max_output_bytes, "limits": limits}
+        payload = json.dumps(request).encode("utf-8") + b"\n"
+        try:
+            self.proc.stdin.write(payload)
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise WorkerDied(str(e))
+        deadline = time.monotonic() + timeout + _REPLY_GRACE_SECONDS
+        out = HeadTailBuffer(max_output_chars)
+        err = HeadTailBuffer(max_output_chars)
+        killed = False
+        while True:
+            frame = self._read_frame(deadline, _CANCEL_POLL_SECONDS if cancel is not None else None)
+            if cancel is not None and cancel.is_set() and self.child_pid is not None and not killed:
+                _kill_group(self.child_pid)
+                killed = True
+            if frame is None:
+                continue
+            stream = frame.get("stream")
+            if stream == "out":
+                out.write(frame["data"])
+                if on_stdout is not None:
+                    on_stdout(frame["data"])
+            elif stream == "err":
+                err.write(frame["data"])
+            elif "started" in frame:
+                self.child_pid = frame["started"]
+            else:
+                self.child_pid = None
+                self.jobs += 1
+                return frame, out, err
+
+    def close(self) -> None:
+        # A child forked for an unfinished request lives in its own session; kill it too.
+        if self.child_pid is not None:
+            _kill_group(self.child_pid)
+            self.child_pid = None
+        if self.proc.poll() is None:
+            self.proc.kill()
+        try:
+            self.proc.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            pass
+
+
+class PoolExhausted(Exception):
+    """No worker became free within Config.runner_pool_wait_seconds; the caller should cold-start instead."""
+
+
+class WorkerPool:
+    """Fixed-size pool of pre-started interpreters that fork a fresh child per harness run."""
+
+    def __init__(self, size: int = 2, max_jobs: int = 50):
+        self.size = size
+        self.max_jobs = max_jobs
+        self._slots: "queue.Queue[Optional[_Worker]]" = queue.Queue()
+        for _ in range(size):
+            self._slots.put(_Worker())
+
+    def run(
+        self,
+        harness_code: str,
+        timeout_seconds: float,
+        on_stdout: Optional[Callable[[str], None]] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> Tuple[int, str, str]:
+        cfg = get_default_config()
+        limits = limits_for(cfg, timeout_seconds).to_dict()
+        worker = self._acquire(cfg.runner_pool_wait_seconds, cancel)
+        try:
+            if worker is None or not worker.alive():
+                worker = _Worker()
+            try:
+                reply, out_buf, err_buf = worker.request(
+                    harness_code, timeout_seconds, on_stdout, cfg.max_output_bytes, cfg.max_output_chars, limits, cancel
+                )
+            except BaseException:
+                # Includes errors raised by on_stdout: the worker is mid-reply, so it cannot be reused.
+                worker.close()
+                worker = None
+                raise
+            if worker.jobs >= self.max_jobs:
+                worker.close()
+                worker = _Worker()
+        finally:
+            self._slots.put(worker)
+
+        if "error" in reply:
+            raise RuntimeError(reply["error"])
+        out, err = out_buf.getvalue(), err_buf.getvalue()
+        if cancel is not None and cancel.is_set():
+            raise RunCancelled(output=out, stderr=err)
+        if reply.get("output_limit"):
+            raise OutputLimitExceeded(cfg.max_output_bytes, output=out, stderr=err, dropped=out_buf.dropped + err_buf.dropped)
+        if reply["timeout"]:
+            raise subprocess.TimeoutExpired("harness.py", timeout_seconds, output=out, stderr=err)
+        if reply["returncode"] != 0:
+            message = describe_limit_exit(reply["returncode"], err, limits, reply.get("oom_killed", False))
+            if message:
+                raise ResourceLimitExceeded(message, output=out, stderr=err)
+        return reply["returncode"], out, err
+
+    def _acquire(self, wait_seconds: float, cancel: Optional[threading.Event]) -> Optional[_Worker]:
+        """Take a worker slot, waiting at most wait_seconds; raises PoolExhausted or RunCancelled."""
+        # Busy workers may be stuck on hanging submissions for a full timeout, so waiting
+        # longer than a cold start would take only delays everyone else's run.
+        deadline = time.monotonic() + wait_seconds
+        while True:
+            if cancel is not None and cancel.is_set():
+                raise RunCancelled()
+            remaining = deadline - time.monotonic()
+            try:
+                return self._slots.get(timeout=max(min(remaining, _CANCEL_POLL_SECONDS), 0.001))
+            except queue.Empty:
+                if remaining <= _CANCEL_POLL_SECONDS:
+                    raise PoolExhausted()
+
+    def close(self) -> None:
+        for _ in range(self.size):
+            worker = self._slots.get()
+            if worker is not None:
+                worker.close()
+
+
+_POOL: Optional[WorkerPool] = None
+_POOL_LOCK = threading.Lock()
+_POOL_OVERRIDE: Optional[Tuple[int, int]] = None
+
+
+def configure_pool(size: int, max_jobs: int) -> None:
+    """Override the configured pool size for this process (e.g. one warm worker per batch process)."""
+    global _POOL_OVERRIDE
+    shutdown_pool()
+    _POOL_OVERRIDE = (size, max_jobs)
+
+
+def get_pool() -> Optional[WorkerPool]:
+    """Return the process-wide pool, or None when pooling is disabled or fork is unavailable."""
+    global _POOL
+    if _POOL_OVERRIDE is not None:
+        size, max_jobs = _POOL_OVERRIDE
+    else:
+        cfg = get_default_config()
+        size, max_jobs = cfg.runner_pool_size, cfg.runner_pool_max_jobs
+    if size <= 0 or not fork_supported():
+        return None
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = WorkerPool(size, max_jobs)
+        return _POOL
+
+
+def shutdown_pool() -> None:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.close()
+            _POOL = None
+
+
+if __name__ == "__main__":
+    _serve()
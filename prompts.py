@@ -0,0 +1,130 @@
+import ast
+import json
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from utils import truncate_text
+
+# Rough size of a token for English text and code; good enough for budgeting.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def summarize_value(value: Any, max_chars: int = 80) -> str:
+    """Short printable form of a test value; large containers keep their type and length."""
+    text = json.dumps(value, ensure_ascii=False, default=repr)
+    if len(text) <= max_chars:
+        return text
+    if isinstance(value, (list, tuple, dict, str)):
+        return f"{type(value).__name__}[len={len(value)}] {truncate_text(text, max_chars)}"
+    return truncate_text(text, max_chars)
+
+
+def _failure_kind(detail: Dict[str, Any]) -> str:
+    err = detail.get("error")
+    if err:
+        return str(err).split(":", 1)[0]
+    return "wrong output"
+
+
+def cluster_failures(details: Sequence[Dict[str, Any]]) -> "OrderedDict[str, List[Dict[str, Any]]]":
+    """Group failing cases by failure kind (exception type or wrong output), dropping exact duplicates."""
+    clusters: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+    seen: Set[Tuple[str, str, str]] = set()
+    for d in details:
+        if d.get("ok"):
+            continue
+        sig = (
+            json.dumps(d.get("expected"), default=repr, sort_keys=True),
+            json.dumps(d.get("output"), default=repr, sort_keys=True),
+            str(d.get("error")),
+        )
+        if sig in seen:
+            continue
+        seen.add(sig)
+        clusters.setdefault(_failure_kind(d), []).append(d)
+    return clusters
+
+
+def format_failures(details: Sequence[Dict[str, Any]], max_tokens: int) -> str:
+    """Render failing cases as clustered bullets that fit in max_tokens."""
+    clusters = cluster_failures(details)
+    if not clusters:
+        return "No previous runs or all tests passed. Suggest potential edge cases."
+    total = sum(len(v) for v in clusters.values())
+    # Shrink examples per cluster, then value width, until the section fits.
+    for examples, width in ((3, 120), (2, 80), (1, 60), (1, 30)):
+        lines = [f"{total} distinct failing case(s) in {len(clusters)} group(s):"]
+        for kind, cases in clusters.items():
+            lines.append(f"* {kind} ({len(cases)} case(s))")
+            for d in cases[:examples]:
+                line = f"  - {d.get('description')}: expected={summarize_value(d.get('expected'), width)} got={summarize_value(d.get('output'), width)}"
+                if d.get("error"):
+                    line += f" error={truncate_text(str(d['error']), width)}"
+                lines.append(line)
+            if len(cases) > examples:
+                lines.append(f"  - ... {len(cases) - examples} more like this")
+        text = "\n".join(lines)
+        if estimate_tokens(text) <= max_tokens:
+            return text
+    return truncate_text(text, max_tokens * CHARS_PER_TOKEN)
+
+
+def _referenced_names(node: ast.AST) -> Set[str]:
+    return {n.id for n in ast.walk(node) if isinstance(n, ast.Name)} | {
+        n.attr for n in ast.walk(node) if isinstance(n, ast.Attribute)
+    }
+
+
+def relevant_code(code: str, function_name: Optional[str], max_tokens: int, max_chars: Optional[int] = None) -> str:
+    """Return code, or when it is over budget only the target function, its helpers and imports."""
+    limit = max_tokens * CHARS_PER_TOKEN
+    if max_chars is not None:
+        limit = min(limit, max_chars)
+    if len(code) <= limit:
+        return code
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return _head_tail(code, limit)
+    top: Dict[str, ast.stmt] = {}
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            top[node.name] = node
+    if not function_name or function_name not in top:
+        return _head_tail(code, limit)
+
+    # Walk from the target function through the top-level definitions it uses.
+    keep: Set[str] = set()
+    todo = [function_name]
+    while todo:
+        name = todo.pop()
+        if name in keep or name not in top:
+            continue
+        keep.add(name)
+        todo.extend(_referenced_names(top[name]) - keep)
+
+    lines = code.splitlines()
+    pieces = []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)) or getattr(node, "name", None) in keep:
+            start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+            pieces.append("\n".join(lines[start - 1:node.end_lineno]))
+    omitted = len(tree.body) - len(pieces)
+    text = "\n\n".join(pieces)
+    if omitted:
+        text += f"\n\n# ... {omitted} unrelated top-level statement(s) omitted"
+    return text if len(text) <= limit else _head_tail(text, limit)
+
+
+def _head_tail(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    marker = "\n# ... (truncated) ...\n"
+    keep = max(limit - len(marker), 0)
+    head = text[: keep * 2 // 3]
+    tail = text[len(text) - (keep - len(head)):] if keep > len(head) else ""
+    return head + marker + tail
@@ -1,32 +1,219 @@
+import codecs
+import os
+import signal
 import subprocess
 import sys
 import tempfile
+import threading
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence, Tuple
 
+from capture import HeadTailBuffer, OutputLimitExceeded, RunCancelled
+from config import Config, get_default_config
+from grading_client import GradingBusy, get_grading_client
+from metrics import span
+from sandbox import ResourceLimitExceeded, RunCgroup, apply_limits, describe_limit_exit, limits_for, open_cgroup
+from pool import PoolExhausted, get_pool
 
-def run_python_in_subprocess(harness_code: str, timeout_seconds: int = 3) -> Tuple[int, str, str]:
-    """Run given Python code in a separate process and return (returncode, stdout, stderr)."""
+
+# Error reported by run_harness for a run stopped through its cancel event.
+RUN_CANCELLED = "Cancelled"
+
+# How often the cold path checks its cancel event.
+_CANCEL_POLL_SECONDS = 0.05
+
+
+def run_python_in_subprocess(
+    harness_code: str,
+    timeout_seconds: int = 3,
+    on_stdout: Optional[Callable[[str], None]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> Tuple[int, str, str]:
+    """Run given Python code in a separate process and return (returncode, stdout, stderr).
+
+    Uses the warm worker pool when it is enabled, otherwise cold-starts a new interpreter.
+    stdout is read incrementally and passed to on_stdout chunk by chunk as it arrives; on
+    timeout, subprocess.TimeoutExpired carries the output produced so far. Only the head
+    and tail of each stream (Config.max_output_chars) are kept, and the child is killed
+    with OutputLimitExceeded once it writes more than Config.max_output_bytes. The child runs
+    under CPU/memory/file/process rlimits (sandbox.limits_for); a run ended by one of them
+    raises ResourceLimitExceeded. Setting cancel kills the child and raises RunCancelled.
+    """
+    pool = get_pool()
+    with span("run_subprocess", path="pool" if pool is not None else "cold") as labels:
+        result = None
+        if pool is not None:
+            try:
+                result = pool.run(harness_code, timeout_seconds, on_stdout, cancel)
+            except PoolExhausted:
+                # Every worker is busy (possibly with hanging code): a cold start beats queueing.
+                labels["path"] = "cold_fallback"
+        if result is None:
+            result = run_cold(harness_code, timeout_seconds, on_stdout, cancel)
+        labels["outcome"] = "ok" if result[0] == 0 else "nonzero_exit"
+        return result
+
+
+def run_cold(
+    harness_code: str,
+    timeout_seconds: float,
+    on_stdout: Optional[Callable[[str], None]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> Tuple[int, str, str]:
+    """Run harness_code in a freshly started interpreter under the configured limits (no pool)."""
+    cfg = get_default_config()
+    limits = limits_for(cfg, timeout_seconds).to_dict()
+    cgroup = open_cgroup(limits) if os.name == "posix" else None
+    try:
+        return _run_cold(harness_code, timeout_seconds, on_stdout, cfg, limits, cgroup, cancel)
+    finally:
+        if cgroup is not None:
+            cgroup.close()
+
+
+def _run_cold(
+    harness_code: str,
+    timeout_seconds: int,
+    on_stdout: Optional[Callable[[str], None]],
+    cfg: Config,
+    limits: Dict[str, Any],
+    cgroup: Optional[RunCgroup],
+    cancel: Optional[threading.Event] = None,
+) -> Tuple[int, str, str]:
     with tempfile.TemporaryDirectory(prefix="ct_runner_") as tmpdir:
         tmp_path = Path(tmpdir)
         harness_path = tmp_path / "harness.py"
         harness_path.write_text(harness_code, encoding="utf-8")
 
-        completed = subprocess.run(
+        proc = subprocess.Popen(
             [sys.executable, "-u", str(harness_path)],
             cwd=str(tmp_path),
-            capture_output=True,
-            text=True,
-            timeout=timeout_seconds,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=os.name == "posix",
+            preexec_fn=(lambda: apply_limits(limits, str(cgroup.path) if cgroup else None)) if os.name == "posix" else None,
         )
-        return completed.returncode, completed.stdout, completed.stderr
+        out_buf = HeadTailBuffer(cfg.max_output_chars)
+        err_buf = HeadTailBuffer(cfg.max_output_chars)
+        # Bytes read from both pipes; only the stderr thread and this thread add to it.
+        written = [0, 0]
+        over_limit = threading.Event()
+
+        def _count(slot: int, n: int) -> None:
+            written[slot] += n
+            if sum(written) > cfg.max_output_bytes and not over_limit.is_set():
+                over_limit.set()
+                _kill(proc)
+
+        def _read_stderr() -> None:
+            for text, n in _read_chunks(proc.stderr.fileno()):
+                err_buf.write(text)
+                _count(1, n)
+
+        err_thread = threading.Thread(target=_read_stderr, daemon=True)
+        err_thread.start()
+        timed_out = threading.Event()
+
+        def _on_timeout() -> None:
+            timed_out.set()
+            _kill(proc)
+
+        watchdog = threading.Timer(timeout_seconds, _on_timeout)
+        watchdog.start()
+        finished = threading.Event()
+        cancelled = threading.Event()
+
+        def _watch_cancel() -> None:
+            while not finished.wait(_CANCEL_POLL_SECONDS):
+                if cancel.is_set():
+                    cancelled.set()
+                    _kill(proc)
+                    return
+
+        if cancel is not None:
+            threading.Thread(target=_watch_cancel, daemon=True).start()
+        try:
+            # stdout is consumed on the calling thread so on_stdout can touch thread-bound state (e.g. UI).
+            for text, n in _read_chunks(proc.stdout.fileno()):
+                out_buf.write(text)
+                if on_stdout is not None and text:
+                    on_stdout(text)
+                _count(0, n)
+                if over_limit.is_set():
+                    break
+            proc.wait()
+        finally:
+            watchdog.cancel()
+            finished.set()
+            if proc.poll() is None:
+                _kill(proc)
+                proc.wait()
+            err_thread.join()
+            proc.stdout.close()
+            proc.stderr.close()
+
+        out = out_buf.getvalue()
+        err = err_buf.getvalue()
+        if cancelled.is_set():
+            raise RunCancelled(output=out, stderr=err)
+        if over_limit.is_set():
+            raise OutputLimitExceeded(cfg.max_output_bytes, output=out, stderr=err, dropped=out_buf.dropped + err_buf.dropped)
+        if timed_out.is_set():
+            raise subprocess.TimeoutExpired(proc.args, timeout_seconds, output=out, stderr=err)
+        if proc.returncode != 0:
+            message = describe_limit_exit(proc.returncode, err, limits, cgroup.oom_killed() if cgroup else False)
+            if message:
+                raise ResourceLimitExceeded(message, output=out, stderr=err)
+        return proc.returncode, out, err
+
+
+def _read_chunks(fd: int) -> Iterator[Tuple[str, int]]:
+    """Yield (decoded text, byte count) for each chunk read from fd until EOF."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    while True:
+        data = os.read(fd, 65536)
+        yield decoder.decode(data, final=not data), len(data)
+        if not data:
+            return
+
+
+def _kill(proc: subprocess.Popen) -> None:
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
 
 
-def run_harness(harness_code: str, timeout_seconds: int = 3) -> Tuple[bool, str, str]:
+def run_harness(
+    harness_code: str,
+    timeout_seconds: int = 3,
+    code_runner: str = "local",
+    on_stdout: Optional[Callable[[str], None]] = None,
+    cancel: Optional[threading.Event] = None,
+    fixtures: Sequence[Path] = (),
+) -> Tuple[bool, str, str]:
+    """Run harness_code locally or on the grading service; fixtures are the files it loads (sent to the service)."""
     try:
-        rc, out, err = run_python_in_subprocess(harness_code, timeout_seconds)
+        if code_runner == "interpreter_api":
+            # The service has no cancel call; a cancelled remote run is simply reported as cancelled.
+            rc, out, err = get_grading_client().run(harness_code, timeout_seconds, on_stdout, fixtures)
+            if cancel is not None and cancel.is_set():
+                raise RunCancelled(output=out, stderr=err)
+        else:
+            rc, out, err = run_python_in_subprocess(harness_code, timeout_seconds, on_stdout, cancel)
         return rc == 0, out, err
+    except RunCancelled as e:
+        return False, e.output, RUN_CANCELLED
     except subprocess.TimeoutExpired as e:
-        return False, "", f"Timeout after {timeout_seconds}s"
+        return False, e.output or "", f"Timeout after {timeout_seconds}s"
+    except ResourceLimitExceeded as e:
+        return False, e.output, str(e)
+    except OutputLimitExceeded as e:
+        return False, e.output, f"Output limit exceeded: the program printed more than {e.limit} bytes and was stopped"
+    except GradingBusy:
+        return False, "", "Grading service is busy, please try again in a moment"
     except Exception as e:
         return False, "", f"Runner error: {str(e)}"
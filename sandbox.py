@@ -0,0 +1,146 @@
+import math
+import os
+import signal
+import subprocess
+import uuid
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from config import Config
+
+
+@dataclass
+class ResourceLimits:
+    cpu_seconds: int
+    memory_mb: int  # address space; 0 disables
+    open_files: int  # 0 disables
+    processes: int  # RLIMIT_NPROC counts every process of the user, not just this run; 0 disables
+    cgroup_dir: str = ""  # delegated cgroup v2 directory to create per-run groups in; "" disables
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def limits_for(cfg: Config, timeout_seconds: float) -> ResourceLimits:
+    # A single-threaded run cannot use more CPU than wall time, so by default the CPU limit only
+    # bites on busy loops that spread over threads or ignore the wall-clock kill.
+    cpu = cfg.run_cpu_limit_seconds or math.ceil(timeout_seconds) + 1
+    return ResourceLimits(
+        cpu_seconds=cpu,
+        memory_mb=cfg.run_memory_limit_mb,
+        open_files=cfg.run_max_open_files,
+        processes=cfg.run_max_processes,
+        cgroup_dir=cfg.run_cgroup_dir,
+    )
+
+
+class ResourceLimitExceeded(subprocess.SubprocessError):
+    """The run was stopped by a CPU or memory limit; output/stderr hold what it printed."""
+
+    def __init__(self, message: str, output: str = "", stderr: str = ""):
+        super().__init__(message)
+        self.output = output
+        self.stderr = stderr
+
+
+def _set(which: int, value: int) -> None:
+    _, hard = resource.getrlimit(which)
+    if hard != resource.RLIM_INFINITY:
+        value = min(value, hard)
+    resource.setrlimit(which, (value, value))
+
+
+def apply_limits(limits: Dict[str, Any], cgroup: Optional[str] = None) -> None:
+    """Restrict the calling process; runs in the child between fork and executing the harness."""
+    if cgroup:
+        # "0" moves the writing process itself, so the child is confined before it runs any user code.
+        with open(os.path.join(cgroup, "cgroup.procs"), "w") as f:
+            f.write("0")
+    if resource is None:
+        return
+    if limits.get("cpu_seconds"):
+        # The soft limit delivers SIGXCPU; the hard limit a second later is SIGKILL.
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        cpu = limits["cpu_seconds"]
+        if hard == resource.RLIM_INFINITY or hard > cpu + 1:
+            hard = cpu + 1
+        resource.setrlimit(resource.RLIMIT_CPU, (min(cpu, hard), hard))
+    if limits.get("memory_mb"):
+        _set(resource.RLIMIT_AS, limits["memory_mb"] * 1024 * 1024)
+    if limits.get("open_files"):
+        _set(resource.RLIMIT_NOFILE, limits["open_files"])
+    if limits.get("processes") and hasattr(resource, "RLIMIT_NPROC"):
+        _set(resource.RLIMIT_NPROC, limits["processes"])
+
+
+class RunCgroup:
+    """A throwaway cgroup v2 child group for one run, created under a delegated directory."""
+
+    def __init__(self, base_dir: str, limits: Dict[str, Any]):
+        self.path = Path(base_dir) / f"run-{uuid.uuid4().hex[:12]}"
+        self.path.mkdir()
+        try:
+            if limits.get("memory_mb"):
+                (self.path / "memory.max").write_text(str(limits["memory_mb"] * 1024 * 1024))
+                (self.path / "memory.swap.max").write_text("0")
+            if limits.get("processes"):
+                (self.path / "pids.max").write_text(str(limits["processes"]))
+        except OSError:
+            self.close()
+            raise
+
+    def oom_killed(self) -> bool:
+        try:
+            for line in (self.path / "memory.events").read_text().splitlines():
+                name, _, count = line.partition(" ")
+                if name == "oom_kill":
+                    return int(count) > 0
+        except OSError:
+            pass
+        return False
+
+    def close(self) -> None:
+        try:
+            # Kills anything the run left behind (kernel 5.14+), so the group can be removed.
+            (self.path / "cgroup.kill").write_text("1")
+        except OSError:
+            pass
+        try:
+            self.path.rmdir()
+        except OSError:
+            pass
+
+
+def open_cgroup(limits: Dict[str, Any]) -> Optional[RunCgroup]:
+    """Return a per-run cgroup when one is configured and usable, else None (rlimits still apply)."""
+    base = limits.get("cgroup_dir")
+    if not base or not os.path.isdir(base):
+        return None
+    try:
+        return RunCgroup(base, limits)
+    except OSError:
+        return None
+
+
+def describe_limit_exit(returncode: int, stderr: str, limits: Dict[str, Any], oom_killed: bool = False) -> Optional[str]:
+    """Name the resource limit that ended a run, or None when the exit looks like an ordinary failure."""
+    sigxcpu = getattr(signal, "SIGXCPU", None)
+    if sigxcpu is not None and returncode == -sigxcpu:
+        return f"CPU time limit exceeded ({limits.get('cpu_seconds')}s of CPU)"
+    memory = f"Memory limit exceeded ({limits.get('memory_mb')} MB)" if limits.get("memory_mb") else "Out of memory"
+    if oom_killed:
+        return memory
+    last = stderr.strip().splitlines()[-1] if stderr.strip() else ""
+    if last.startswith("MemoryError"):
+        return memory
+    sigkill = getattr(signal, "SIGKILL", None)
+    if sigkill is not None and returncode == -sigkill:
+        # The runner's own kills (timeout, output cap) are reported before this; this is the OOM killer.
+        return f"{memory}: the program was killed by the system"
+    return None
@@ -1,27 +1,261 @@
-import os
+import argparse
+import hashlib
 import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from metrics import timed
 
 SESSIONS_DIR = Path(__file__).resolve().parent / "sessions"
 SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
+DB_NAME = "sessions.sqlite3"
+
+# Per-task values stored for a session, keyed by kind.
+_KINDS = ("code", "results")
+
+
+@dataclass
+class SessionInfo:
+    name: str
+    created: float
+    updated: float
+    tasks: int
+    # Analytics id of the student who saved it; None for sessions saved before ids were stored.
+    student: Optional[str] = None
+
+
+class SessionStore:
+    """Sessions in SQLite (WAL): one row per (session, task, kind), rewritten only when it changed."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE,
+                created REAL NOT NULL,
+                updated REAL NOT NULL,
+                student TEXT
+            );
+            CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated);
+            CREATE TABLE IF NOT EXISTS items (
+                session_id INTEGER NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+                task_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                value TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                updated REAL NOT NULL,
+                PRIMARY KEY (session_id, task_id, kind)
+            );
+            CREATE TABLE IF NOT EXISTS imported_files (
+                filename TEXT PRIMARY KEY,
+                mtime REAL NOT NULL
+            );
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(sessions)")}
+        if "student" not in columns:
+            self._conn.execute("ALTER TABLE sessions ADD COLUMN student TEXT")
+
+    @timed("storage", op="save")
+    def save(self, name: str, values: Dict[str, Dict[str, Any]], student: Optional[str] = None) -> int:
+        """Upsert session name with values {kind: {task_id: value}}; returns the number of rows written.
+
+        student, when given, becomes the session's analytics id.
+        """
+        now = time.time()
+        rows = []
+        for kind in _KINDS:
+            for task_id, value in (values.get(kind) or {}).items():
+                text = json.dumps(value, ensure_ascii=False, sort_keys=True, default=repr)
+                rows.append((task_id, kind, text, hashlib.sha1(text.encode("utf-8")).hexdigest()))
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    """
+                    INSERT INTO sessions (name, created, updated, student) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (name) DO UPDATE SET student = COALESCE(excluded.student, student)
+                    """,
+                    (name, now, now, student),
+                )
+                session_id = self._conn.execute("SELECT id FROM sessions WHERE name = ?", (name,)).fetchone()[0]
+                stored = {
+                    (task_id, kind): digest
+                    for task_id, kind, digest in self._conn.execute(
+                        "SELECT task_id, kind, digest FROM items WHERE session_id = ?", (session_id,)
+                    )
+                }
+                changed = [
+                    (session_id, task_id, kind, text, digest, now)
+                    for task_id, kind, text, digest in rows
+                    if stored.get((task_id, kind)) != digest
+                ]
+                if changed:
+                    self._conn.executemany("INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?, ?)", changed)
+                    self._conn.execute("UPDATE sessions SET updated = ? WHERE id = ?", (now, session_id))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(changed)
+
+    @timed("storage", op="load")
+    def load(self, name: str) -> Dict[str, Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT id, student FROM sessions WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                raise KeyError(f"Unknown session: {name}")
+            items = self._conn.execute("SELECT task_id, kind, value FROM items WHERE session_id = ?", (row[0],)).fetchall()
+        session: Dict[str, Any] = {"name": name, "student": row[1], **{kind: {} for kind in _KINDS}}
+        for task_id, kind, value in items:
+            session.setdefault(kind, {})[task_id] = json.loads(value)
+        return session
+
+    def items(self, name: str, kind: str, since: float = 0.0) -> List[Tuple[str, Any, float]]:
+        """(task_id, value, updated) of one kind for session name, written after since."""
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT i.task_id, i.value, i.updated FROM items i JOIN sessions s ON s.id = i.session_id
+                WHERE s.name = ? AND i.kind = ? AND i.updated > ? ORDER BY i.updated
+                """,
+                (name, kind, since),
+            ).fetchall()
+        return [(task_id, json.loads(value), updated) for task_id, value, updated in rows]
+
+    @timed("storage", op="list")
+    def list(self, query: str = "", limit: int = 50, offset: int = 0, order: str = "updated") -> List[SessionInfo]:
+        """One page of sessions whose name contains query, newest first (or by name with order="name")."""
+        order_by = "s.name" if order == "name" else "s.updated DESC"
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT s.name, s.created, s.updated,
+                       (SELECT COUNT(*) FROM items i WHERE i.session_id = s.id AND i.kind = 'code'), s.student
+                FROM sessions s WHERE s.name LIKE ? ESCAPE '\\'
+                ORDER BY {order_by} LIMIT ? OFFSET ?
+                """,
+                (_like(query), limit, offset),
+            ).fetchall()
+        return [SessionInfo(*row) for row in rows]
+
+    @timed("storage", op="count")
+    def count(self, query: str = "") -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM sessions WHERE name LIKE ? ESCAPE '\\'", (_like(query),)
+            ).fetchone()[0]
+
+    def iter_code(self, task_ids: Optional[Set[str]] = None) -> Iterator[Tuple[str, str, str]]:
+        """Yield (session, task_id, code) for every stored submission, in session name order."""
+        last = ""
+        while True:
+            # Paged by name so a long export never holds the lock (or a read cursor) for long.
+            with self._lock:
+                page = self._conn.execute(
+                    "SELECT id, name FROM sessions WHERE name > ? ORDER BY name LIMIT 100", (last,)
+                ).fetchall()
+                if not page:
+                    return
+                names = dict(page)
+                marks = ",".join("?" * len(page))
+                items = self._conn.execute(
+                    f"SELECT session_id, task_id, value FROM items WHERE kind = 'code' AND session_id IN ({marks})",
+                    list(names),
+                ).fetchall()
+            items.sort(key=lambda row: (names[row[0]], row[1]))
+            for session_id, task_id, value in items:
+                code = json.loads(value)
+                if code and (task_ids is None or task_id in task_ids):
+                    yield names[session_id], task_id, code
+            last = page[-1][1]
 
+    def import_json_dir(self, directory: Path) -> int:
+        """Import legacy sessions/*.json files not imported before (or changed since); returns how many."""
+        with self._lock:
+            seen = dict(self._conn.execute("SELECT filename, mtime FROM imported_files"))
+        imported = 0
+        for path in sorted(directory.glob("*.json")):
+            mtime = path.stat().st_mtime
+            if seen.get(path.name) == mtime:
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+            self.save(path.stem, data)
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE sessions SET created = MIN(created, ?) WHERE name = ?", (mtime, path.stem)
+                )
+                self._conn.execute("INSERT OR REPLACE INTO imported_files VALUES (?, ?)", (path.name, mtime))
+            imported += 1
+        return imported
 
-def save_session(session: Dict[str, Any]) -> Path:
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _like(query: str) -> str:
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+_STORES: Dict[Path, SessionStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_session_store(directory: Path = SESSIONS_DIR) -> SessionStore:
+    """Process-wide store for directory; legacy JSON sessions found there are imported on first use."""
+    directory = directory.resolve()
+    with _STORES_LOCK:
+        store = _STORES.get(directory)
+        if store is None:
+            store = _STORES[directory] = SessionStore(directory / DB_NAME)
+            store.import_json_dir(directory)
+        return store
+
+
+def save_session(session: Dict[str, Any]) -> str:
+    """Save session under its name (a timestamped one if unset) and return the name.
+
+    Saving again under the same name only writes the tasks whose code or result changed.
+    """
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
     name = session.get("name") or f"session_{ts}"
-    path = SESSIONS_DIR / f"{name}.json"
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(session, f, ensure_ascii=False, indent=2)
-    return path
+    get_session_store().save(name, session, session.get("student"))
+    return name
+
+
+def list_sessions(query: str = "", limit: int = 50, offset: int = 0) -> List[SessionInfo]:
+    return get_session_store().list(query, limit, offset)
+
+
+def count_sessions(query: str = "") -> int:
+    return get_session_store().count(query)
 
 
-def list_sessions() -> List[str]:
-    return sorted([p.name for p in SESSIONS_DIR.glob("*.json")])
+def load_session(name: str) -> Dict[str, Any]:
+    return get_session_store().load(name)
 
 
-def load_session(filename: str) -> Dict[str, Any]:
-    path = SESSIONS_DIR / filename
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Session store maintenance.")
+    parser.add_argument("--import-json", default=str(SESSIONS_DIR), help="Directory of legacy *.json sessions to import.")
+    args = parser.parse_args()
+    source = Path(args.import_json)
+    print(f"imported {get_session_store().import_json_dir(source)} session file(s) from {source}")
@@ -0,0 +1,8 @@
+def factorial(n: int) -> int:
+    """Return n! for n >= 0; raise ValueError for negative n."""
+    if n < 0:
+        raise ValueError("n must be non-negative")
+    result = 1
+    for i in range(2, n + 1):
+        result *= i
+    return result
@@ -0,0 +1,3 @@
+def make_input(n):
+    half = "ab" * (n // 4)
+    return [half + half[::-1]]
@@ -0,0 +1,4 @@
+def is_palindrome(s: str) -> bool:
+    """Return True if s reads the same forwards and backwards (case-insensitive, ignore spaces)."""
+    s_clean = ''.join(ch.lower() for ch in s if not ch.isspace())
+    return s_clean == s_clean[::-1]
@@ -0,0 +1,2 @@
+def make_input(n):
+    return ["abcdefghij" * (n // 10)]
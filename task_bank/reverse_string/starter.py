@@ -0,0 +1,3 @@
+def reverse_string(s: str) -> str:
+    """Return the reversed string."""
+    return s[::-1]
@@ -0,0 +1,4 @@
+def sum_two_numbers(a: int, b: int) -> int:
+    """Return the sum of a and b."""
+    # Write your solution below
+    return a + b
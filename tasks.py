@@ -1,5 +1,18 @@
-from dataclasses import dataclass
-from typing import Any, Dict, List
+import argparse
+import base64
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+TASK_BANK_DIR = Path(os.getenv("TASK_BANK_DIR", str(Path(__file__).resolve().parent / "task_bank")))
+INDEX_FILE = "index.json"
+TASK_FILES = ("task.json", "starter.py", "tests.json", "perf.py")
+# How often list_tasks() re-stats the bank to notice edits; each check is one stat per task.
+INDEX_RECHECK_SECONDS = 2.0
 
 
 @dataclass
@@ -10,6 +23,17 @@ class TestCase:
     expected_output: Any
 
 
+@dataclass
+class PerfSpec:
+    # Python source defining make_input(n) -> list of positional args for an input of size n.
+    input_generator: str
+    sizes: List[int]
+    expected_complexity: str  # e.g. "O(n)", "O(n log n)", "O(n^2)"
+    time_budget_seconds: float = 1.0
+    warmup: int = 1
+    repeats: int = 3
+
+
 @dataclass
 class Task:
     id: str
@@ -18,133 +42,207 @@ class Task:
     function_name: str
     starter_code: str
     tests: List[TestCase]
+    perf: Optional[PerfSpec] = None
+    difficulty: str = ""
+    tags: List[str] = field(default_factory=list)
+    # Set by cache.tests_fingerprint on first use. load_task hands out one Task per version of the
+    # files, so the tests are hashed once per edit rather than on every harness build and cache lookup.
+    fingerprint: Optional[str] = field(default=None, init=False, repr=False, compare=False)
 
 
-def _task_sum_two_numbers() -> Task:
-    starter = '''
-def sum_two_numbers(a: int, b: int) -> int:
-    """Return the sum of a and b."""
-    # Write your solution below
-    return a + b
-'''.strip()
-    tests = [
-        TestCase("small positives", [1, 2], {}, 3),
-        TestCase("with zero", [0, 5], {}, 5),
-        TestCase("negatives", [-3, -7], {}, -10),
-    ]
-    return Task(
-        id="sum_two_numbers",
-        title="Sum Two Numbers",
-        description="Implement sum_two_numbers(a, b) -> int that returns a + b.",
-        function_name="sum_two_numbers",
-        starter_code=starter,
-        tests=tests,
-    )
-
+@dataclass
+class TaskSummary:
+    """Index entry: enough to list and filter tasks without reading their files."""
 
-def _task_is_palindrome() -> Task:
-    starter = '''
-def is_palindrome(s: str) -> bool:
-    """Return True if s reads the same forwards and backwards (case-insensitive, ignore spaces)."""
-    s_clean = ''.join(ch.lower() for ch in s if not ch.isspace())
-    return s_clean == s_clean[::-1]
-'''.strip()
+    id: str
+    title: str
+    difficulty: str = ""
+    tags: List[str] = field(default_factory=list)
+
+
+# Each task lives in TASK_BANK_DIR/<id>/:
+#   task.json   metadata (id, title, description, function_name, difficulty, tags, optional perf)
+#   starter.py  starter code shown in the editor
+#   tests.json  [{"description", "args", "kwargs", "expected"}, ...], values typed as in TAGGED_TYPES
+#   perf.py     make_input(n) for the complexity check, when task.json has "perf"
+
+# Values JSON has no type for are written as a one-key object, e.g. {"__tuple__": [1, 2]}.
+# "__dict__" holds [key, value] pairs, for dicts whose keys are not all strings.
+TAGGED_TYPES = {
+    "__tuple__": tuple,
+    "__set__": set,
+    "__frozenset__": frozenset,
+    "__bytes__": base64.b64decode,
+    "__dict__": dict,
+    "__float__": float,  # "inf", "-inf", "nan"
+}
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, list):
+        return [_decode_value(v) for v in value]
+    if isinstance(value, dict):
+        if len(value) == 1:
+            tag, inner = next(iter(value.items()))
+            decode = TAGGED_TYPES.get(tag)
+            if decode is not None:
+                return decode(inner if tag in ("__bytes__", "__float__") else _decode_value(inner))
+        return {k: _decode_value(v) for k, v in value.items()}
+    return value
+
+
+def _read_task(task_dir: Path) -> Task:
+    meta = json.loads((task_dir / "task.json").read_text(encoding="utf-8"))
+    cases = json.loads((task_dir / "tests.json").read_text(encoding="utf-8"))
     tests = [
-        TestCase("racecar", ["racecar"], {}, True),
-        TestCase("mixed case", ["RaceCar"], {}, True),
-        TestCase("with space", ["nurses run"], {}, True),
-        TestCase("not palindrome", ["python"], {}, False),
+        TestCase(
+            c["description"],
+            _decode_value(c.get("args", [])),
+            _decode_value(c.get("kwargs", {})),
+            _decode_value(c.get("expected")),
+        )
+        for c in cases
     ]
+    perf = None
+    if meta.get("perf"):
+        spec = dict(meta["perf"])
+        perf = PerfSpec(input_generator=(task_dir / "perf.py").read_text(encoding="utf-8"), **spec)
     return Task(
-        id="is_palindrome",
-        title="Palindrome Checker",
-        description="Return True if a string is a palindrome (case-insensitive, ignoring spaces).",
-        function_name="is_palindrome",
-        starter_code=starter,
+        id=meta.get("id", task_dir.name),
+        title=meta["title"],
+        description=meta["description"],
+        function_name=meta["function_name"],
+        starter_code=(task_dir / "starter.py").read_text(encoding="utf-8").strip(),
         tests=tests,
+        perf=perf,
+        difficulty=meta.get("difficulty", ""),
+        tags=list(meta.get("tags", [])),
     )
 
 
-def _task_fizz_buzz() -> Task:
-    starter = '''
-def fizz_buzz(n: int) -> str:
-    """Return 'Fizz' for multiples of 3, 'Buzz' for multiples of 5, 'FizzBuzz' for both, else str(n)."""
-    if n % 15 == 0:
-        return "FizzBuzz"
-    if n % 3 == 0:
-        return "Fizz"
-    if n % 5 == 0:
-        return "Buzz"
-    return str(n)
-'''.strip()
-    tests = [
-        TestCase("3 -> Fizz", [3], {}, "Fizz"),
-        TestCase("5 -> Buzz", [5], {}, "Buzz"),
-        TestCase("15 -> FizzBuzz", [15], {}, "FizzBuzz"),
-        TestCase("2 -> '2'", [2], {}, "2"),
+def _scan(bank_dir: Path) -> List[TaskSummary]:
+    entries = []
+    for meta_path in sorted(bank_dir.glob("*/task.json")):
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        entries.append(
+            TaskSummary(
+                id=meta.get("id", meta_path.parent.name),
+                title=meta["title"],
+                difficulty=meta.get("difficulty", ""),
+                tags=list(meta.get("tags", [])),
+            )
+        )
+    return entries
+
+
+def build_index(bank_dir: Path = TASK_BANK_DIR) -> List[TaskSummary]:
+    """Scan every task.json under bank_dir and write index.json; returns the entries."""
+    entries = _scan(bank_dir)
+    payload = {"version": 1, "tasks": [e.__dict__ for e in entries]}
+    tmp = bank_dir / (INDEX_FILE + ".tmp")
+    tmp.write_text(json.dumps(payload, indent=1, ensure_ascii=False) + "\n", encoding="utf-8")
+    os.replace(tmp, bank_dir / INDEX_FILE)
+    # The rename bumped the directory mtime; keep the index at least as new so it is not seen as stale.
+    os.utime(bank_dir / INDEX_FILE)
+    return entries
+
+
+# Process-wide caches, shared by every session/rerun. Entries are keyed by file mtimes,
+# so edits on disk are picked up on the next lookup.
+_LOCK = threading.Lock()
+_INDEX: Optional[Tuple[float, Tuple[float, float], List[TaskSummary]]] = None
+_TASKS: Dict[str, Tuple[Tuple[float, ...], Task]] = {}
+
+
+def _mtime(path: Path) -> float:
+    try:
+        return path.stat().st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+def _newest_source_mtime(bank_dir: Path) -> float:
+    """Newest mtime of the bank directory and of every task.json/tests.json in it.
+
+    Adding or removing a task directory touches the bank directory itself, but editing a
+    task's files in place only touches those files.
+    """
+    newest = _mtime(bank_dir)
+    try:
+        task_dirs = [e.path for e in os.scandir(bank_dir) if e.is_dir()]
+    except FileNotFoundError:
+        return newest
+    for task_dir in task_dirs:
+        for name in ("task.json", "tests.json"):
+            newest = max(newest, _mtime(Path(task_dir) / name))
+    return newest
+
+
+def _load_index() -> List[TaskSummary]:
+    global _INDEX
+    now = time.monotonic()
+    with _LOCK:
+        if _INDEX is not None and now - _INDEX[0] < INDEX_RECHECK_SECONDS:
+            return _INDEX[2]
+    index_path = TASK_BANK_DIR / INDEX_FILE
+    stamp = (_mtime(index_path), _newest_source_mtime(TASK_BANK_DIR))
+    with _LOCK:
+        if _INDEX is not None and _INDEX[1] == stamp:
+            _INDEX = (now, stamp, _INDEX[2])
+            return _INDEX[2]
+        if stamp[0] == 0.0 or stamp[0] < stamp[1]:
+            try:
+                entries = build_index(TASK_BANK_DIR)
+                stamp = (_mtime(index_path), _newest_source_mtime(TASK_BANK_DIR))
+            except OSError:
+                # Read-only bank: use a fresh scan for this process instead.
+                entries = _scan(TASK_BANK_DIR)
+        else:
+            data = json.loads(index_path.read_text(encoding="utf-8"))
+            entries = [TaskSummary(**e) for e in data["tasks"]]
+        _INDEX = (now, stamp, entries)
+        return entries
+
+
+def list_tasks(query: str = "", difficulty: Optional[str] = None, tags: Optional[List[str]] = None) -> List[TaskSummary]:
+    """Index entries matching a title/id substring, a difficulty and all of the given tags."""
+    query = query.strip().lower()
+    wanted = set(tags or [])
+    return [
+        e
+        for e in _load_index()
+        if (not query or query in e.title.lower() or query in e.id.lower())
+        and (not difficulty or e.difficulty == difficulty)
+        and wanted.issubset(e.tags)
     ]
-    return Task(
-        id="fizz_buzz",
-        title="FizzBuzz",
-        description="Classic FizzBuzz problem.",
-        function_name="fizz_buzz",
-        starter_code=starter,
-        tests=tests,
-    )
 
 
-def _task_factorial() -> Task:
-    starter = '''
-def factorial(n: int) -> int:
-    """Return n! for n >= 0; raise ValueError for negative n."""
-    if n < 0:
-        raise ValueError("n must be non-negative")
-    result = 1
-    for i in range(2, n + 1):
-        result *= i
-    return result
-'''.strip()
-    tests = [
-        TestCase("0!", [0], {}, 1),
-        TestCase("1!", [1], {}, 1),
-        TestCase("5!", [5], {}, 120),
-    ]
-    return Task(
-        id="factorial",
-        title="Factorial",
-        description="Compute factorial of n (iterative).",
-        function_name="factorial",
-        starter_code=starter,
-        tests=tests,
-    )
+def load_task(task_id: str) -> Task:
+    """Read one task's files, reusing the cached Task while none of them changed."""
+    if not task_id or task_id != Path(task_id).name or task_id.startswith("."):
+        raise KeyError(f"Unknown task: {task_id}")
+    task_dir = TASK_BANK_DIR / task_id
+    stamp = tuple(_mtime(task_dir / name) for name in TASK_FILES)
+    with _LOCK:
+        cached = _TASKS.get(task_id)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+    if not stamp[0]:
+        raise KeyError(f"Unknown task: {task_id}")
+    task = _read_task(task_dir)
+    with _LOCK:
+        _TASKS[task_id] = (stamp, task)
+    return task
 
 
-def _task_reverse_string() -> Task:
-    starter = '''
-def reverse_string(s: str) -> str:
-    """Return the reversed string."""
-    return s[::-1]
-'''.strip()
-    tests = [
-        TestCase("simple", ["abc"], {}, "cba"),
-        TestCase("empty", [""], {}, ""),
-        TestCase("unicode", ["Привет"], {}, "тевирП"),
-    ]
-    return Task(
-        id="reverse_string",
-        title="Reverse String",
-        description="Return the reversed string.",
-        function_name="reverse_string",
-        starter_code=starter,
-        tests=tests,
-    )
+def get_tasks() -> List[Task]:
+    """Every task in the bank, fully loaded. Prefer list_tasks() + load_task() for large banks."""
+    return [load_task(e.id) for e in list_tasks()]
 
 
-def get_tasks() -> List[Task]:
-    return [
-        _task_sum_two_numbers(),
-        _task_is_palindrome(),
-        _task_fizz_buzz(),
-        _task_factorial(),
-        _task_reverse_string(),
-    ]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Task bank maintenance.")
+    parser.add_argument("--build-index", action="store_true", help="Rebuild task_bank/index.json.")
+    args = parser.parse_args()
+    if args.build_index:
+        print(f"indexed {len(build_index())} tasks")